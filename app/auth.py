@@ -1,60 +1,101 @@
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from cachetools import TTLCache
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import jwt
+from jwt import InvalidTokenError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from typing import Optional
 import os
 
 from app.database import get_db
 from app import models
+from app import utils
 
 SECRET_KEY = os.getenv("SECRET_KEY", "smartspend-secret-key-2026-super-secure-change-in-production")
+SECRET_KEY_BYTES = SECRET_KEY.encode()  # PyJWT would re-encode a str key on every call
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 90  # ✅ Refresh tokens last longer
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
+# auto_error=False: a missing/non-bearer header comes through as None and is
+# rejected in get_current_user with a single 401
+security = HTTPBearer(auto_error=False)
+
+# Every protected route resolves the bearer token, so keep recently seen
+# tokens (-> user_id, exp) and users around briefly instead of redoing the
+# HMAC check and the users SELECT on each request. TTLCache isn't thread-safe
+# and sync dependencies run in the threadpool, hence the lock.
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+_user_cache = TTLCache(maxsize=10_000, ttl=30)
+_cache_lock = threading.Lock()
+
+
+def _b64url(raw: bytes) -> bytes:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=")
+
+
+# The header never changes, so encode it once instead of per token
+_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+
+
+def _encode_hs256(payload: dict) -> str:
+    """Sign an HS256 JWT with one-shot hmac.digest; tokens are read back with PyJWT"""
+    payload_b64 = _b64url(json.dumps(payload, separators=(",", ":")).encode())
+    signing_input = _HEADER_B64 + b"." + payload_b64
+    signature = hmac.digest(SECRET_KEY_BYTES, signing_input, "sha256")
+    return (signing_input + b"." + _b64url(signature)).decode()
 
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    now = int(time.time())
+    to_encode.update({"exp": now + ACCESS_TOKEN_EXPIRE_DAYS * 86400, "iat": now, "type": "access"})
+    return _encode_hs256(to_encode)
 
 
 def create_refresh_token(data: dict):
     """Create a longer-lived refresh token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    now = int(time.time())
+    to_encode.update({"exp": now + REFRESH_TOKEN_EXPIRE_DAYS * 86400, "iat": now, "type": "refresh"})
+    return _encode_hs256(to_encode)
+
+
+def create_reset_token(email: str) -> str:
+    """Create a short-lived (5 min) password reset token"""
+    now = int(time.time())
+    return _encode_hs256({
+        "user_email": email,
+        "purpose": "password_reset",
+        "exp": now + 5 * 60,
+        "type": "password_reset",
+    })
+
+
+# Missing or null claims fail inside PyJWT's decode with the expiry check,
+# so a refresh token only needs its type compared afterwards
+_refresh_decoder = jwt.PyJWT(options={"require": ["exp", "type", "user_id"]})
 
 
 def verify_refresh_token(token: str):
     """Verify and decode refresh token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _refresh_decoder.decode(token, SECRET_KEY_BYTES, algorithms=[ALGORITHM])
         
-        if payload.get("type") != "refresh":
+        if payload["type"] != "refresh":
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token type"
             )
         
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
-        
-        return user_id
-    except JWTError:
+        return payload["user_id"]
+    except InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token"
@@ -62,21 +103,28 @@ def verify_refresh_token(token: str):
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return utils.verify_password(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return utils.hash_password(password)
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    token = credentials.credentials
-    
+def invalidate_user_cache(user_id: int):
+    """Drop a cached user, e.g. after their password changed"""
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def _decode_user_id(token: str) -> int:
+    token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with _cache_lock:
+        cached = _token_cache.get(token_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY_BYTES, algorithms=[ALGORITHM])
         user_id: int = payload.get("user_id")
         
         if user_id is None:
@@ -85,19 +133,47 @@ def get_current_user(
                 detail="Could not validate credentials"
             )
         
-    except JWTError as e:
+    except InvalidTokenError as e:
         print(f"❌ JWT Error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
+
+    with _cache_lock:
+        _token_cache[token_key] = (user_id, payload["exp"])
+    return user_id
+
+
+def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: Session = Depends(get_db)
+):
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user_id = _decode_user_id(credentials.credentials)
+
+    with _cache_lock:
+        user = _user_cache.get(user_id)
+    if user is not None:
+        return user
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.get(models.User, user_id)
     
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
+
+    # Detach so the request's commit doesn't expire the cached instance
+    db.expunge(user)
+    with _cache_lock:
+        _user_cache[user_id] = user
     
     return user
\ No newline at end of file
@@ -1,5 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
 import os
 from dotenv import load_dotenv
 
@@ -7,9 +10,71 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Behind PgBouncer in transaction mode the bouncer does the pooling; holding
+# our own connections (or asyncpg prepared statements) across it breaks.
+USE_PGBOUNCER = os.getenv("PGBOUNCER") == "1"
+
+if USE_PGBOUNCER:
+    _pool_args = {"poolclass": NullPool}
+else:
+    # Sized above the threadpool's burst so sync handlers don't queue on
+    # checkout; recycle before the server's idle timeout drops connections.
+    _pool_args = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 20)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 40)),
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    }
+
+# Headroom over SQLAlchemy's default 500 entries so every distinct statement
+# the app issues stays compiled instead of being evicted and re-rendered
+QUERY_CACHE_SIZE = 1200
+
+engine = create_engine(DATABASE_URL, query_cache_size=QUERY_CACHE_SIZE, **_pool_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_url(url):
+    """Same database as DATABASE_URL, through the asyncio driver for its backend"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes "ssl" rather than libpq's "sslmode"
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+        # Per-connection cache of server-side prepared statements, so repeated
+        # queries skip Parse/Plan; PgBouncer can't carry them between clients
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": "0" if USE_PGBOUNCER else "500"}
+        )
+    elif backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+if USE_PGBOUNCER:
+    async_engine = create_async_engine(
+        _async_url(DATABASE_URL),
+        poolclass=NullPool,
+        connect_args={"statement_cache_size": 0},
+        query_cache_size=QUERY_CACHE_SIZE,
+    )
+else:
+    async_engine = create_async_engine(
+        _async_url(DATABASE_URL),
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        query_cache_size=QUERY_CACHE_SIZE,
+    )
+# Handlers read attributes after commit; with asyncio that can't lazy-load
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -18,3 +83,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,8 +1,9 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app import models
-from app.database import engine
+from app.migrate import migrate
 from app.routes_auth import router as auth_router
 from app.routes_income import router as income_router
 from app.routes_expense import router as expense_router
@@ -17,16 +18,26 @@ from app.routes_reminders import router as reminders_router
 from app.routes_password import router as password_router  # ← ADD THIS
 
 
-models.Base.metadata.create_all(bind=engine)
+# create_all checks every table with a round-trip, so schema setup runs in
+# the deploy's release phase (see Procfile) instead of on each worker boot.
+# Set AUTO_MIGRATE=1 to run it at startup, e.g. for local development.
+if os.getenv("AUTO_MIGRATE") == "1":
+    migrate()
 
 app = FastAPI(title="SmartSpend API")
 
+# Auth is a bearer header, not cookies, so credentials mode isn't needed and
+# the middleware can send a fixed Allow-Origin instead of echoing each Origin.
+# Set CORS_ORIGINS (comma-separated) to lock it down to known frontends.
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=False,
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # let browsers cache preflights for a day
 )
 
 # ✅ ALL ROUTES UNDER /api
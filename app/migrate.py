@@ -0,0 +1,103 @@
+"""
+Schema setup for the deploy's release phase (see Procfile)
+create_all only creates missing tables, so columns, constraints and indexes
+added to existing tables are applied here. Every step checks the live schema
+and is safe to run again.
+
+Run with: python -m app.migrate
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import AddConstraint
+
+from app import models
+from app.database import engine
+
+
+def _add_user_totals(conn):
+    """Add User.total_income/total_expenses and backfill them from existing rows"""
+    inspector = inspect(conn)
+    if not inspector.has_table("users"):
+        return  # Fresh database: create_all makes the table with the columns
+
+    columns = {c["name"] for c in inspector.get_columns("users")}
+    missing = [name for name in ("total_income", "total_expenses") if name not in columns]
+    if not missing:
+        return
+
+    for name in missing:
+        conn.execute(text(f"ALTER TABLE users ADD COLUMN {name} FLOAT NOT NULL DEFAULT 0"))
+
+    # Same transaction as the ALTERs, so the columns never read 0 for a user
+    # with existing income or expenses
+    for name, table in (("total_income", "income"), ("total_expenses", "expenses")):
+        if inspector.has_table(table):
+            conn.execute(text(
+                f"UPDATE users SET {name} = COALESCE("
+                f"(SELECT SUM(amount) FROM {table} WHERE {table}.user_id = users.id), 0)"
+            ))
+
+
+def _scope_sms_hash_per_user(conn):
+    """
+    Replace the old unique index on detected_transactions.sms_hash with the
+    per-user uq_detected_user_hash that _insert_detected's ON CONFLICT targets
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table("detected_transactions"):
+        return
+
+    table = models.DetectedTransaction.__table__
+    indexes = {ix["name"]: ix for ix in inspector.get_indexes(table.name)}
+
+    # A global unique would keep rejecting a hash another user already has
+    old = indexes.get("ix_detected_transactions_sms_hash")
+    if old is not None and old["unique"]:
+        conn.execute(text("DROP INDEX ix_detected_transactions_sms_hash"))
+        next(ix for ix in table.indexes if ix.name == old["name"]).create(conn)
+
+    existing = set(indexes) | {uc["name"] for uc in inspector.get_unique_constraints(table.name)}
+    if "uq_detected_user_hash" in existing:
+        return
+    # Rows were globally unique by sms_hash, so they are unique per user too.
+    # SQLite can't ALTER in a constraint; a unique index serves ON CONFLICT
+    # the same way.
+    if conn.dialect.name == "postgresql":
+        constraint = next(c for c in table.constraints if c.name == "uq_detected_user_hash")
+        conn.execute(AddConstraint(constraint))
+    else:
+        conn.execute(text(
+            "CREATE UNIQUE INDEX uq_detected_user_hash ON detected_transactions (user_id, sms_hash)"
+        ))
+
+
+# Indexes the models used to declare and have since replaced
+_REPLACED_INDEXES = (
+    "ix_reminder_user_nextpay",  # -> ix_reminders_active_upcoming (active rows only)
+    "ix_income_user",  # -> ix_income_user_date
+    "ix_otp_email_used",  # -> ix_otp_email_used_expires
+)
+
+
+def _drop_replaced_indexes(conn):
+    for name in _REPLACED_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _create_missing_indexes(conn):
+    """Indexes declared on the models that tables created before them don't have"""
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def migrate():
+    with engine.begin() as conn:
+        _add_user_totals(conn)
+        _scope_sms_hash_per_user(conn)
+        _drop_replaced_indexes(conn)
+        models.Base.metadata.create_all(bind=conn)
+        _create_missing_indexes(conn)
+
+
+if __name__ == "__main__":
+    migrate()
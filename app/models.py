@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -15,6 +15,11 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
 
+    # Running totals kept in step with Income/Expense writes (see
+    # routes_summary.adjust_totals) so the summary is a single-row read
+    total_income = Column(Float, nullable=False, default=0.0, server_default="0")
+    total_expenses = Column(Float, nullable=False, default=0.0, server_default="0")
+
     incomes = relationship("Income", back_populates="user")
     expenses = relationship("Expense", back_populates="user")
     goals = relationship("Goal", back_populates="user")
@@ -32,6 +37,11 @@ class PasswordResetOTP(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Invalidate-on-request DELETE and the verify lookup both seek on this
+        Index("ix_otp_email_used_expires", "email", "used", "expires_at"),
+    )
+
 
 class Income(Base):
     __tablename__ = "income"
@@ -45,6 +55,10 @@ class Income(Base):
 
     user = relationship("User", back_populates="incomes")
 
+    __table_args__ = (
+        Index("ix_income_user_date", "user_id", date.desc(), id.desc()),
+    )
+
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -59,6 +73,12 @@ class Expense(Base):
 
     user = relationship("User", back_populates="expenses")
 
+    __table_args__ = (
+        # get_expenses reads rows newest-first straight off the index; id is
+        # the keyset pagination tiebreaker
+        Index("ix_expense_user_date", "user_id", date.desc(), id.desc()),
+    )
+
 
 class ExpensePattern(Base):
     __tablename__ = "expense_patterns"
@@ -100,6 +120,11 @@ class ExpenseSuggestion(Base):
 
     user = relationship("User")
 
+    __table_args__ = (
+        # generate_expense_suggestions' pending-category lookup is answered from the index
+        Index("ix_suggestion_user_status_cat", "user_id", "status", "category"),
+    )
+
 
 class Goal(Base):
     __tablename__ = "goals"
@@ -120,6 +145,10 @@ class Goal(Base):
 
     user = relationship("User", back_populates="goals")
 
+    __table_args__ = (
+        Index("ix_goal_user_created", "user_id", created_at.desc(), id.desc()),
+    )
+
 
 class DetectedTransaction(Base):
     __tablename__ = "detected_transactions"
@@ -141,12 +170,18 @@ class DetectedTransaction(Base):
     status = Column(String, default="pending")
     source = Column(String, default="sms")
 
-    # sms_hash = Column(String, index=True)
-    sms_hash = Column(String, index=True, unique=True)  # ✅ Add unique=True
+    sms_hash = Column(String, index=True)
     account_number = Column(String)
     reference_number = Column(String)
 
     user = relationship("User")
+
+    __table_args__ = (
+        # Dedup is per user; routes_detected inserts with ON CONFLICT DO NOTHING
+        UniqueConstraint("user_id", "sms_hash", name="uq_detected_user_hash"),
+        # Covers the pending list / count queries in routes_detected
+        Index("ix_detected_user_status_date", "user_id", "status", "transaction_date"),
+    )
 #
 
 class RecurringReminder(Base):
@@ -177,6 +212,18 @@ class RecurringReminder(Base):
 
     user = relationship("User")
 
+    __table_args__ = (
+        # Active list ordered by day_of_month
+        Index("ix_reminder_user_active_day", "user_id", "is_active", "day_of_month"),
+        # Upcoming window: only active reminders are ever queried by date. The
+        # route keeps its is_active filter so the planner can match the predicate.
+        Index(
+            "ix_reminders_active_upcoming", "user_id", "next_payment_date",
+            postgresql_where=is_active == True,
+            sqlite_where=is_active == True,
+        ),
+    )
+
 
 class ReminderNotification(Base):
     __tablename__ = "reminder_notifications"
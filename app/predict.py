@@ -21,7 +21,7 @@ def predict_next_month(
     Legacy endpoint - kept for backward compatibility
     Use /forecast for enhanced predictions
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     forecast = ml_service.forecast_next_month()
     return {"prediction": forecast.get("predicted_amount", 0)}
 
@@ -41,7 +41,7 @@ def forecast_next_month(
         "trend": "UP | DOWN | STABLE"
     }
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     return ml_service.forecast_next_month()
 
 
@@ -64,7 +64,7 @@ def detect_budget_risks(
         }
     ]
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     risks = ml_service.detect_budget_risks()
     return risks
 
@@ -87,7 +87,7 @@ def detect_overspending_patterns(
         }
     ]
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     insights = ml_service.detect_overspending_patterns()
     return insights
 
@@ -108,7 +108,7 @@ def get_smart_recommendations(
         }
     ]
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     recommendations = ml_service.generate_recommendations()
     return recommendations
 
@@ -130,7 +130,7 @@ def explain_predictions(
         ]
     }
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     explanation = ml_service.explain_predictions()
     return explanation
 
@@ -153,6 +153,6 @@ def generate_alerts(
         }
     ]
     """
-    ml_service = MLService(db, current_user.id)
+    ml_service = MLService.get(db, current_user.id)
     alerts = ml_service.generate_alerts()
     return alerts
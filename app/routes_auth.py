@@ -2,13 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app import schemas, models
 from app.database import get_db
-from app.utils import hash_password, verify_password
-from app.auth import create_access_token, create_refresh_token, verify_refresh_token, SECRET_KEY, ALGORITHM
+from app.utils import hash_password, verify_password, needs_rehash
+from app.auth import create_access_token, create_refresh_token, create_reset_token, verify_refresh_token, invalidate_user_cache, SECRET_KEY_BYTES, ALGORITHM
 from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
-from jose import jwt, JWTError
-import random
-import string
+import jwt
+from jwt import InvalidTokenError
+import secrets
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -41,6 +41,11 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     if not db_user or not verify_password(user.password, db_user.password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
+    # Upgrade legacy bcrypt hashes to argon2id while we have the plain password
+    if needs_rehash(db_user.password):
+        db_user.password = hash_password(user.password)
+        db.commit()
+
     access_token  = create_access_token({"user_id": db_user.id})
     refresh_token = create_refresh_token({"user_id": db_user.id})
 
@@ -57,7 +62,7 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 @router.post("/refresh")
 def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)):
     user_id = verify_refresh_token(refresh_token)
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     new_access_token = create_access_token({"user_id": user_id})
@@ -79,14 +84,7 @@ class ResetPasswordRequest(BaseModel):
     new_password: str
 
 def generate_otp() -> str:
-    return "".join(random.choices(string.digits, k=6))
-
-def create_reset_token(email: str) -> str:
-    expire = datetime.utcnow() + timedelta(minutes=5)
-    return jwt.encode(
-        {"user_email": email, "purpose": "password_reset", "exp": expire, "type": "password_reset"},
-        SECRET_KEY, algorithm=ALGORITHM
-    )
+    return f"{secrets.randbelow(10**6):06d}"
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -102,8 +100,7 @@ def forgot_password(payload: ForgotPasswordRequest, db: Session = Depends(get_db
     db.query(models.PasswordResetOTP).filter(
         models.PasswordResetOTP.email == payload.email,
         models.PasswordResetOTP.used  == False
-    ).delete()
-    db.commit()
+    ).delete(synchronize_session=False)
 
     otp        = generate_otp()
     expires_at = datetime.utcnow() + timedelta(minutes=10)
@@ -152,13 +149,13 @@ def verify_otp(payload: VerifyOTPRequest, db: Session = Depends(get_db)):
 @router.post("/reset-password")
 def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_db)):
     try:
-        data = jwt.decode(payload.reset_token, SECRET_KEY, algorithms=[ALGORITHM])
+        data = jwt.decode(payload.reset_token, SECRET_KEY_BYTES, algorithms=[ALGORITHM])
         if data.get("purpose") != "password_reset":
             raise HTTPException(status_code=400, detail="Invalid reset token")
         email = data.get("user_email")
         if not email:
             raise HTTPException(status_code=400, detail="Invalid reset token")
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=400, detail="Reset token is invalid or expired")
 
     user = db.query(models.User).filter(models.User.email == email).first()
@@ -170,4 +167,5 @@ def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_db))
 
     user.password = hash_password(payload.new_password)
     db.commit()
+    invalidate_user_cache(user.id)
     return {"message": "Password reset successfully. You can now log in."}
\ No newline at end of file
@@ -1,17 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timedelta
+from typing import List, Optional
+from cachetools import TTLCache
 import logging
+import orjson
+import threading
 
 from app.database import get_db
 from app.auth import get_current_user
-from app import models
+from app.routes_summary import adjust_totals, invalidate_summary
+from app import models, schemas
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/detected", tags=["Detected"])
 logger = logging.getLogger(__name__)
 
+# (user_id, sms_hash) pairs this worker has already stored or seen rejected as
+# duplicates. Detected rows are never deleted, so a hit means the row exists and
+# the client is re-sending it; the unique constraint stays the source of truth.
+_seen_hashes = TTLCache(maxsize=50_000, ttl=3600)
+_seen_lock = threading.Lock()
+
+
+def _mark_seen(user_id: int, sms_hash: str):
+    with _seen_lock:
+        _seen_hashes[(user_id, sms_hash)] = True
+
+
+def _was_seen(user_id: int, sms_hash: str) -> bool:
+    with _seen_lock:
+        return (user_id, sms_hash) in _seen_hashes
+
 
 class DetectedTransactionCreate(BaseModel):
     amount: int
@@ -23,46 +45,49 @@ class DetectedTransactionCreate(BaseModel):
     credit_source: str = ""
 
 
+def _insert_detected(db: Session, user_id: int, data: DetectedTransactionCreate) -> Optional[int]:
+    """
+    Insert a pending detected transaction in one round-trip.
+    Returns the new id, or None if this user already has the sms_hash.
+    """
+    dialect = sqlite if db.get_bind().dialect.name == "sqlite" else postgresql
+    stmt = (
+        dialect.insert(models.DetectedTransaction)
+        .values(
+            user_id=user_id,
+            amount=data.amount,
+            transaction_type=data.transaction_type,
+            merchant=data.merchant,
+            category_guess=data.category_guess,
+            category=data.category_guess,
+            transaction_date=datetime.fromtimestamp(data.transaction_date / 1000),
+            status="pending",
+            source="sms",
+            sms_hash=data.sms_hash,
+            credit_source=data.credit_source,
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "sms_hash"])
+        .returning(models.DetectedTransaction.id)
+    )
+    new_id = db.execute(stmt).scalar()
+    db.commit()
+    return new_id
+
+
 @router.post("/create")
 def create_detected_transaction(
     data: DetectedTransactionCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    existing = (
-        db.query(models.DetectedTransaction)
-        .filter(
-            models.DetectedTransaction.user_id == current_user.id,
-            models.DetectedTransaction.sms_hash == data.sms_hash,
-        )
-        .first()
-    )
-    if existing:
+    if _was_seen(current_user.id, data.sms_hash):
         raise HTTPException(status_code=409, detail="Duplicate transaction")
 
-    txn_date = datetime.fromtimestamp(data.transaction_date / 1000)
-
-    detected = models.DetectedTransaction(
-        user_id=current_user.id,
-        amount=data.amount,
-        transaction_type=data.transaction_type,
-        merchant=data.merchant,
-        category_guess=data.category_guess,
-        category=data.category_guess,
-        transaction_date=txn_date,
-        status="pending",
-        source="sms",
-        sms_hash=data.sms_hash,
-        credit_source=data.credit_source,
-    )
-
-    try:
-        db.add(detected)
-        db.commit()
-        return {"message": "Detected transaction created"}
-    except IntegrityError:
-        db.rollback()
+    new_id = _insert_detected(db, current_user.id, data)
+    _mark_seen(current_user.id, data.sms_hash)
+    if new_id is None:
         raise HTTPException(status_code=409, detail="Duplicate transaction")
+    return {"message": "Detected transaction created"}
 
 
 @router.post("/sync")
@@ -71,65 +96,68 @@ def sync_detected_transaction(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    existing = (
-        db.query(models.DetectedTransaction)
+    # Known re-sends only need their current status, so skip the no-op INSERT
+    if not _was_seen(current_user.id, data.sms_hash):
+        new_id = _insert_detected(db, current_user.id, data)
+        _mark_seen(current_user.id, data.sms_hash)
+        if new_id is not None:
+            return {"synced": True, "status": "pending"}
+
+    existing_status = (
+        db.query(models.DetectedTransaction.status)
         .filter(
             models.DetectedTransaction.user_id == current_user.id,
             models.DetectedTransaction.sms_hash == data.sms_hash,
         )
-        .first()
+        .scalar()
     )
-    if existing:
-        return {"synced": True, "status": existing.status}
-
-    txn_date = datetime.fromtimestamp(data.transaction_date / 1000)
-
-    detected = models.DetectedTransaction(
-        user_id=current_user.id,
-        amount=data.amount,
-        transaction_type=data.transaction_type,
-        merchant=data.merchant,
-        category_guess=data.category_guess,
-        category=data.category_guess,
-        transaction_date=txn_date,
-        status="pending",
-        source="sms",
-        sms_hash=data.sms_hash,
-        credit_source=data.credit_source,
-    )
-    db.add(detected)
-    db.commit()
-    return {"synced": True, "status": "pending"}
+    return {"synced": True, "status": existing_status}
 
 
-@router.get("/pending")
+@router.get("/pending", response_model=List[schemas.PendingTransactionOut])
 def get_pending_transactions(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
+    DT = models.DetectedTransaction
     pending = (
-        db.query(models.DetectedTransaction)
+        db.query(
+            DT.id,
+            DT.amount,
+            DT.merchant,
+            DT.category_guess,
+            DT.transaction_date,
+            DT.sms_hash,
+            DT.status,
+            DT.transaction_type,
+            DT.credit_source,
+        )
         .filter(
-            models.DetectedTransaction.user_id == current_user.id,
-            models.DetectedTransaction.status == "pending",
+            DT.user_id == current_user.id,
+            DT.status == "pending",
         )
-        .order_by(models.DetectedTransaction.transaction_date.desc())
+        .order_by(DT.transaction_date.desc())
         .all()
     )
-    return [
-        {
-            "id": t.id,
-            "amount": t.amount,
-            "merchant": t.merchant,
-            "category_guess": t.category_guess,
-            "transaction_date": t.transaction_date.isoformat(),
-            "sms_hash": t.sms_hash,
-            "status": t.status,
-            "transaction_type": t.transaction_type,
-            "credit_source": getattr(t, "credit_source", "") or "",
-        }
-        for t in pending
-    ]
+    # orjson writes datetimes in the same ISO format as .isoformat(), and
+    # returning the bytes directly skips FastAPI's jsonable_encoder walk
+    return Response(
+        orjson.dumps([
+            {
+                "id": t.id,
+                "amount": t.amount,
+                "merchant": t.merchant,
+                "category_guess": t.category_guess,
+                "transaction_date": t.transaction_date,
+                "sms_hash": t.sms_hash,
+                "status": t.status,
+                "transaction_type": t.transaction_type,
+                "credit_source": t.credit_source or "",
+            }
+            for t in pending
+        ]),
+        media_type="application/json",
+    )
 
 
 @router.get("/count")
@@ -138,12 +166,12 @@ def get_pending_count(
     current_user: models.User = Depends(get_current_user),
 ):
     count = (
-        db.query(models.DetectedTransaction)
+        db.query(func.count(models.DetectedTransaction.id))
         .filter(
             models.DetectedTransaction.user_id == current_user.id,
             models.DetectedTransaction.status == "pending",
         )
-        .count()
+        .scalar()
     )
     return {"count": count}
 
@@ -153,71 +181,115 @@ def get_pending_count_split(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    debit_count = (
-        db.query(models.DetectedTransaction)
-        .filter(
-            models.DetectedTransaction.user_id == current_user.id,
-            models.DetectedTransaction.status == "pending",
-            models.DetectedTransaction.transaction_type == "debit",
+    counts = dict(
+        db.query(
+            models.DetectedTransaction.transaction_type,
+            func.count(models.DetectedTransaction.id),
         )
-        .count()
-    )
-    credit_count = (
-        db.query(models.DetectedTransaction)
         .filter(
             models.DetectedTransaction.user_id == current_user.id,
             models.DetectedTransaction.status == "pending",
-            models.DetectedTransaction.transaction_type == "credit",
+            models.DetectedTransaction.transaction_type.in_(("debit", "credit")),
         )
-        .count()
+        .group_by(models.DetectedTransaction.transaction_type)
+        .all()
     )
+    debit_count = counts.get("debit", 0)
+    credit_count = counts.get("credit", 0)
     return {"debit": debit_count, "credit": credit_count, "total": debit_count + credit_count}
 
 
+def _claim_detected(db: Session, user_id: int, sms_hash: str, new_status: str, final_statuses: tuple):
+    """
+    Move a detected transaction to new_status unless it's already in one of
+    final_statuses, in a single UPDATE ... RETURNING. Returns the fields needed
+    to book it, or None if no row was updated.
+    """
+    DT = models.DetectedTransaction
+    return db.execute(
+        update(DT)
+        .where(
+            DT.user_id == user_id,
+            DT.sms_hash == sms_hash,
+            DT.status.notin_(final_statuses),
+        )
+        .values(status=new_status)
+        .returning(
+            DT.amount,
+            DT.merchant,
+            DT.category,
+            DT.category_guess,
+            DT.transaction_date,
+            DT.transaction_type,
+            DT.credit_source,
+        )
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+def _current_state(db: Session, user_id: int, sms_hash: str):
+    """Status of a transaction the claim didn't update, or None if it doesn't exist"""
+    DT = models.DetectedTransaction
+    return (
+        db.query(DT.status, DT.amount, DT.merchant, DT.transaction_type)
+        .filter(DT.user_id == user_id, DT.sms_hash == sms_hash)
+        .first()
+    )
+
+
+def _book_detected(db: Session, user_id: int, detected):
+    """Record a claimed detected transaction as Income (credit) or Expense (debit)"""
+    if detected.transaction_type == "credit":
+        credit_source = detected.credit_source or "Other"
+        db.add(models.Income(
+            user_id=user_id,
+            amount=detected.amount,
+            source=detected.merchant if detected.merchant and detected.merchant != "UNKNOWN"
+                   else (credit_source or "SMS Income"),
+            date=detected.transaction_date,
+            is_auto=True,
+        ))
+        db.execute(adjust_totals(user_id, income=detected.amount))
+    else:
+        db.add(models.Expense(
+            user_id=user_id,
+            amount=detected.amount,
+            category=detected.category or detected.category_guess,
+            merchant=detected.merchant,
+            date=detected.transaction_date,
+            is_auto=True,
+        ))
+        db.execute(adjust_totals(user_id, expenses=detected.amount))
+
+
 @router.post("/accept/{sms_hash}")
 def accept_transaction(
     sms_hash: str,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    detected = (
-        db.query(models.DetectedTransaction)
-        .filter(
-            models.DetectedTransaction.user_id == current_user.id,
-            models.DetectedTransaction.sms_hash == sms_hash,
-        )
-        .first()
-    )
+    detected = _claim_detected(db, current_user.id, sms_hash, "accepted", ("accepted", "ignored"))
 
-    if not detected:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+    if detected is None:
+        state = _current_state(db, current_user.id, sms_hash)
+        if not state:
+            raise HTTPException(status_code=404, detail="Transaction not found")
 
-    if detected.status == "accepted":
-        return {
-            "message": "Already accepted",
-            "amount": detected.amount,
-            "merchant": detected.merchant,
-            "transaction_type": getattr(detected, "transaction_type", "debit"),
-        }
+        if state.status == "accepted":
+            return {
+                "message": "Already accepted",
+                "amount": state.amount,
+                "merchant": state.merchant,
+                "transaction_type": state.transaction_type,
+            }
 
-    if detected.status == "ignored":
         return {"message": "Already ignored"}
 
-    txn_type = getattr(detected, "transaction_type", "debit")
+    _book_detected(db, current_user.id, detected)
+    db.commit()
+    invalidate_summary(current_user.id)
 
-    if txn_type == "credit":
-        credit_source = getattr(detected, "credit_source", "Other") or "Other"
-        income = models.Income(
-            user_id=current_user.id,
-            amount=detected.amount,
-            source=detected.merchant if detected.merchant and detected.merchant != "UNKNOWN"
-                   else (credit_source or "SMS Income"),
-            date=detected.transaction_date,
-            is_auto=True,
-        )
-        db.add(income)
-        detected.status = "accepted"
-        db.commit()
+    if detected.transaction_type == "credit":
         logger.info(f"✅ Credit accepted → Income (₹{detected.amount})")
         return {
             "message": "Credit accepted and added to income",
@@ -227,17 +299,6 @@ def accept_transaction(
             "transaction_type": "credit",
         }
     else:
-        expense = models.Expense(
-            user_id=current_user.id,
-            amount=detected.amount,
-            category=detected.category or detected.category_guess,
-            merchant=detected.merchant,
-            date=detected.transaction_date,
-            is_auto=True,
-        )
-        db.add(expense)
-        detected.status = "accepted"
-        db.commit()
         logger.info(f"✅ Debit accepted → Expense (₹{detected.amount})")
         return {
             "message": "Transaction accepted",
@@ -254,22 +315,12 @@ def ignore_transaction(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    detected = (
-        db.query(models.DetectedTransaction)
-        .filter(
-            models.DetectedTransaction.user_id == current_user.id,
-            models.DetectedTransaction.sms_hash == sms_hash,
-        )
-        .first()
-    )
+    if _claim_detected(db, current_user.id, sms_hash, "ignored", ("ignored", "accepted")) is None:
+        state = _current_state(db, current_user.id, sms_hash)
+        if not state:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        return {"message": f"Already {state.status}"}
 
-    if not detected:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-
-    if detected.status in ("ignored", "accepted"):
-        return {"message": f"Already {detected.status}"}
-
-    detected.status = "ignored"
     db.commit()
     return {"message": "Transaction ignored"}
 
@@ -280,49 +331,21 @@ def auto_accept_transaction(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    detected = (
-        db.query(models.DetectedTransaction)
-        .filter(
-            models.DetectedTransaction.user_id == current_user.id,
-            models.DetectedTransaction.sms_hash == sms_hash,
-        )
-        .first()
-    )
-
-    if not detected:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+    detected = _claim_detected(db, current_user.id, sms_hash, "auto_confirmed", ("accepted", "auto_confirmed"))
 
-    if detected.status in ("accepted", "auto_confirmed"):
-        return {"message": "Already processed", "status": detected.status}
+    if detected is None:
+        state = _current_state(db, current_user.id, sms_hash)
+        if not state:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        return {"message": "Already processed", "status": state.status}
 
-    txn_type = getattr(detected, "transaction_type", "debit")
+    _book_detected(db, current_user.id, detected)
+    db.commit()
+    invalidate_summary(current_user.id)
 
-    if txn_type == "credit":
-        credit_source = getattr(detected, "credit_source", "Other") or "Other"
-        income = models.Income(
-            user_id=current_user.id,
-            amount=detected.amount,
-            source=detected.merchant if detected.merchant and detected.merchant != "UNKNOWN"
-                   else (credit_source or "SMS Income"),
-            date=detected.transaction_date,
-            is_auto=True,
-        )
-        db.add(income)
-        detected.status = "auto_confirmed"
-        db.commit()
+    if detected.transaction_type == "credit":
         return {"message": "Auto-confirmed as income", "amount": detected.amount, "transaction_type": "credit"}
     else:
-        expense = models.Expense(
-            user_id=current_user.id,
-            amount=detected.amount,
-            category=detected.category or detected.category_guess,
-            merchant=detected.merchant,
-            date=detected.transaction_date,
-            is_auto=True,
-        )
-        db.add(expense)
-        detected.status = "auto_confirmed"
-        db.commit()
         return {"message": "Auto-confirmed as expense", "amount": detected.amount, "transaction_type": "debit"}
 
 
@@ -332,16 +355,14 @@ def mark_old_as_missed(
     current_user: models.User = Depends(get_current_user),
 ):
     cutoff = datetime.utcnow() - timedelta(minutes=10)
-    old = (
+    marked = (
         db.query(models.DetectedTransaction)
         .filter(
             models.DetectedTransaction.user_id == current_user.id,
             models.DetectedTransaction.status == "pending",
             models.DetectedTransaction.transaction_date < cutoff,
         )
-        .all()
+        .update({"status": "missed"}, synchronize_session=False)
     )
-    for t in old:
-        t.status = "missed"
     db.commit()
-    return {"marked": len(old)}
\ No newline at end of file
+    return {"marked": marked}
\ No newline at end of file
@@ -1,35 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, select, tuple_
 from datetime import datetime
+from typing import Optional
 
 from app import models, schemas
-from app.database import get_db
+from app.database import get_async_db
 from app.auth import get_current_user
+from app.routes_summary import adjust_totals, invalidate_summary
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
+# Serialises the whole list in one pydantic-core pass. Routes that return its
+# bytes keep response_model only to document the shape in the OpenAPI schema.
+_EXPENSE_LIST = TypeAdapter(list[schemas.ExpenseOut])
+
 
 # -------------------------
 # MANUAL EXPENSE ONLY
 # -------------------------
 @router.post("/", response_model=schemas.ExpenseOut)
-def add_expense(
+async def add_expense(
     expense: schemas.ExpenseCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    new_expense = models.Expense(
-        user_id=current_user.id,
-        amount=expense.amount,
-        category=expense.category,
-        merchant=expense.merchant or None,   # ← NEW
-        date=expense.date or datetime.utcnow(),
-        is_auto=False
+    # INSERT ... RETURNING hands back the stored row; no refresh SELECT
+    result = await db.execute(
+        insert(models.Expense)
+        .values(
+            user_id=current_user.id,
+            amount=expense.amount,
+            category=expense.category,
+            merchant=expense.merchant or None,   # ← NEW
+            date=expense.date or datetime.utcnow(),
+            is_auto=False
+        )
+        .returning(models.Expense)
     )
-
-    db.add(new_expense)
-    db.commit()
-    db.refresh(new_expense)
+    new_expense = result.scalar_one()
+    await db.execute(adjust_totals(current_user.id, expenses=expense.amount))
+    await db.commit()
+    invalidate_summary(current_user.id)
 
     return new_expense
 
@@ -37,37 +50,62 @@ def add_expense(
 # -------------------------
 # GET ALL EXPENSES
 # -------------------------
+# Newest first. Pass limit to page through long histories: the next page
+# starts after the (date, id) of the last expense received.
 @router.get("/", response_model=list[schemas.ExpenseOut])
-def get_expenses(
-    db: Session = Depends(get_db),
+async def get_expenses(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return (
-        db.query(models.Expense)
-        .filter(models.Expense.user_id == current_user.id)
-        .order_by(models.Expense.date.desc())
-        .all()
+    # Plain rows instead of ORM instances: nothing to track in the identity map
+    stmt = (
+        select(
+            models.Expense.id,
+            models.Expense.user_id,
+            models.Expense.amount,
+            models.Expense.category,
+            models.Expense.merchant,
+            models.Expense.date,
+            models.Expense.is_auto,
+        )
+        .where(models.Expense.user_id == current_user.id)
+        .order_by(models.Expense.date.desc(), models.Expense.id.desc())
     )
+    if after_date is not None and after_id is not None:
+        stmt = stmt.where(tuple_(models.Expense.date, models.Expense.id) < (after_date, after_id))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    rows = result.all()
+    expenses = [schemas.ExpenseOut.from_orm_trusted(row) for row in rows]
+    return Response(_EXPENSE_LIST.dump_json(expenses), media_type="application/json")
 
 
 # -------------------------
 # DELETE EXPENSE
 # -------------------------
 @router.delete("/{expense_id}")
-def delete_expense(
+async def delete_expense(
     expense_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    expense = db.query(models.Expense).filter(
-        models.Expense.id == expense_id,
-        models.Expense.user_id == current_user.id
-    ).first()
+    # Ownership check and delete in one statement; no row back means 404
+    result = await db.execute(
+        delete(models.Expense)
+        .where(models.Expense.id == expense_id, models.Expense.user_id == current_user.id)
+        .returning(models.Expense.amount)
+    )
+    amount = result.scalar_one_or_none()
 
-    if not expense:
+    if amount is None:
         raise HTTPException(status_code=404, detail="Expense not found")
 
-    db.delete(expense)
-    db.commit()
+    await db.execute(adjust_totals(current_user.id, expenses=-amount))
+    await db.commit()
+    invalidate_summary(current_user.id)
 
     return {"message": "Expense deleted"}
\ No newline at end of file
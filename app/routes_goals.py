@@ -1,144 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, select, tuple_, update
 from datetime import datetime
+from typing import Optional
+import orjson
 from app import schemas, models
-from app.database import get_db
+from app.database import get_async_db
 from app.auth import get_current_user
+from app.routes_summary import adjust_totals, invalidate_summary
 
 router = APIRouter(prefix="/goals", tags=["goals"])
 
 
 @router.post("/")
-def create_goal(
+async def create_goal(
     goal: schemas.GoalCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    new_goal = models.Goal(
-        user_id=current_user.id,
-        title=goal.title,
-        description=goal.description,
-        target_amount=goal.target_amount,
-        target_date=goal.target_date
+    result = await db.execute(
+        insert(models.Goal)
+        .values(
+            user_id=current_user.id,
+            title=goal.title,
+            description=goal.description,
+            target_amount=goal.target_amount,
+            target_date=goal.target_date
+        )
+        .returning(models.Goal)
     )
-    db.add(new_goal)
-    db.commit()
-    db.refresh(new_goal)
+    new_goal = result.scalar_one()
+    await db.commit()
     return new_goal
 
 
 @router.get("/")
-def get_goals(
-    db: Session = Depends(get_db),
+async def get_goals(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return (
-        db.query(models.Goal)
-        .filter(models.Goal.user_id == current_user.id)
-        .order_by(models.Goal.created_at.desc())
-        .all()
+    """
+    Newest goals first. With limit, continue from the (created_at, id) of the
+    last goal received.
+    """
+    stmt = (
+        select(models.Goal.__table__)
+        .where(models.Goal.user_id == current_user.id)
+        .order_by(models.Goal.created_at.desc(), models.Goal.id.desc())
+    )
+    if after_created_at is not None and after_id is not None:
+        stmt = stmt.where(tuple_(models.Goal.created_at, models.Goal.id) < (after_created_at, after_id))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    # Rows go straight to orjson; FastAPI has nothing left to encode
+    return Response(
+        orjson.dumps([dict(row._mapping) for row in result]),
+        media_type="application/json",
     )
 
 
 @router.get("/{goal_id}")
-def get_goal(
+async def get_goal(
     goal_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    goal = db.query(models.Goal).filter(
-        models.Goal.id == goal_id,
-        models.Goal.user_id == current_user.id
-    ).first()
+    goal = await db.get(models.Goal, goal_id)
     
-    if not goal:
+    if not goal or goal.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Goal not found")
     
     return goal
 
 
 @router.put("/{goal_id}")
-def update_goal(
+async def update_goal(
     goal_id: int,
     updated: schemas.GoalUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    goal = db.query(models.Goal).filter(
-        models.Goal.id == goal_id,
-        models.Goal.user_id == current_user.id
-    ).first()
+    # UPDATE ... RETURNING checks ownership and hands back the row in one go
+    fields = updated.model_dump(exclude_none=True)
+    stmt = update(models.Goal).values(**fields).returning(models.Goal) if fields else select(models.Goal)
+    result = await db.execute(
+        stmt.where(models.Goal.id == goal_id, models.Goal.user_id == current_user.id)
+    )
+    goal = result.scalar_one_or_none()
     
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    if updated.title is not None:
-        goal.title = updated.title
-    if updated.description is not None:
-        goal.description = updated.description
-    if updated.target_amount is not None:
-        goal.target_amount = updated.target_amount
-    if updated.current_amount is not None:
-        goal.current_amount = updated.current_amount
-    if updated.target_date is not None:
-        goal.target_date = updated.target_date
-    if updated.status is not None:
-        goal.status = updated.status
-    
-    db.commit()
-    db.refresh(goal)
+    await db.commit()
     return goal
 
 
 @router.delete("/{goal_id}")
-def delete_goal(
+async def delete_goal(
     goal_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    goal = db.query(models.Goal).filter(
-        models.Goal.id == goal_id,
-        models.Goal.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        delete(models.Goal)
+        .where(models.Goal.id == goal_id, models.Goal.user_id == current_user.id)
+        .returning(models.Goal.id)
+    )
     
-    if not goal:
+    if result.first() is None:
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    db.delete(goal)
-    db.commit()
+    await db.commit()
     return {"message": "Goal deleted successfully"}
 
 
 @router.post("/{goal_id}/add-amount")
-def add_amount_to_goal(
+async def add_amount_to_goal(
     goal_id: int,
     amount: float,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Add amount to goal. This creates an expense entry to deduct from savings.
     """
-    goal = db.query(models.Goal).filter(
-        models.Goal.id == goal_id,
-        models.Goal.user_id == current_user.id
-    ).first()
+    # Goal and the owner's running totals in one round-trip
+    result = await db.execute(
+        select(models.Goal, models.User.total_income, models.User.total_expenses)
+        .join(models.User, models.User.id == models.Goal.user_id)
+        .where(models.Goal.id == goal_id, models.Goal.user_id == current_user.id)
+    )
+    row = result.one_or_none()
     
-    if not goal:
+    if not row:
         raise HTTPException(status_code=404, detail="Goal not found")
     
     # Check available savings
-    from sqlalchemy import func
-    total_income = (
-        db.query(func.sum(models.Income.amount))
-        .filter(models.Income.user_id == current_user.id)
-        .scalar() or 0.0
-    )
-    total_expenses = (
-        db.query(func.sum(models.Expense.amount))
-        .filter(models.Expense.user_id == current_user.id)
-        .scalar() or 0.0
-    )
+    goal, total_income, total_expenses = row
     available_savings = total_income - total_expenses
     
     if amount > available_savings:
@@ -155,6 +157,7 @@ def add_amount_to_goal(
         date=datetime.utcnow()
     )
     db.add(goal_expense)
+    await db.execute(adjust_totals(current_user.id, expenses=amount))
     
     # Update goal progress
     goal.current_amount += amount
@@ -164,7 +167,8 @@ def add_amount_to_goal(
         goal.status = "completed"
         goal.current_amount = goal.target_amount
     
-    db.commit()
-    db.refresh(goal)
+    await db.commit()
+    invalidate_summary(current_user.id)
+    await db.refresh(goal)
     return goal
 
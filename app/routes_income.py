@@ -1,72 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from datetime import datetime
+from typing import Optional
+import orjson
 from app import schemas, models
-from app.database import get_db
+from app.database import get_async_db
 from app.auth import get_current_user   
+from app.routes_summary import adjust_totals, invalidate_summary
 
 
 router = APIRouter(prefix="/income", tags=["income"])
 
 
 @router.post("/")
-def add_income(
+async def add_income(
     income: schemas.IncomeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    new_income = models.Income(
-        user_id=current_user.id,
-        amount=income.amount,
-        source=income.source,
-        date=income.date
+    result = await db.execute(
+        insert(models.Income)
+        .values(
+            user_id=current_user.id,
+            amount=income.amount,
+            source=income.source,
+            date=income.date
+        )
+        .returning(models.Income)
     )
-    db.add(new_income)
-    db.commit()
-    db.refresh(new_income)
+    new_income = result.scalar_one()
+    await db.execute(adjust_totals(current_user.id, income=income.amount))
+    await db.commit()
+    invalidate_summary(current_user.id)
     return new_income
 
 
 @router.get("/")
-def get_income(
-    db: Session = Depends(get_db),
+async def get_income(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return db.query(models.Income).filter(
-        models.Income.user_id == current_user.id
-    ).all()
+    # Newest first, continuing after the (date, id) of the last row received
+    stmt = (
+        select(models.Income.__table__)
+        .where(models.Income.user_id == current_user.id)
+        .order_by(models.Income.date.desc(), models.Income.id.desc())
+    )
+    if after_date is not None and after_id is not None:
+        stmt = stmt.where(tuple_(models.Income.date, models.Income.id) < (after_date, after_id))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    # Pre-encoded bytes skip FastAPI's jsonable_encoder walk
+    return Response(
+        orjson.dumps([dict(row._mapping) for row in result]),
+        media_type="application/json",
+    )
+
 @router.delete("/{income_id}")
-def delete_income(income_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    income = db.query(models.Income).filter(models.Income.id == income_id, models.Income.user_id == current_user.id).first()
+async def delete_income(income_id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    result = await db.execute(
+        delete(models.Income)
+        .where(models.Income.id == income_id, models.Income.user_id == current_user.id)
+        .returning(models.Income.amount)
+    )
+    amount = result.scalar_one_or_none()
 
-    if not income:
+    if amount is None:
         raise HTTPException(status_code=404, detail="Income not found")
 
-    db.delete(income)
-    db.commit()
+    await db.execute(adjust_totals(current_user.id, income=-amount))
+    await db.commit()
+    invalidate_summary(current_user.id)
 
     return {"message": "Income deleted"}
 @router.put("/{income_id}")
-def update_income(
+async def update_income(
     income_id: int,
     updated: schemas.IncomeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    income = db.query(models.Income).filter(
-        models.Income.id == income_id,
-        models.Income.user_id == current_user.id
-    ).first()
+    owned = (models.Income.id == income_id, models.Income.user_id == current_user.id)
+    fields = updated.model_dump(exclude_none=True)
+
+    if "amount" in fields:
+        # Shift the running total by new - old before the old amount is overwritten;
+        # an unowned id leaves it untouched and the 404 below rolls back anyway
+        old_amount = select(models.Income.amount).where(*owned).scalar_subquery()
+        await db.execute(adjust_totals(
+            current_user.id, income=func.coalesce(updated.amount - old_amount, 0)
+        ))
+
+    # UPDATE ... RETURNING checks ownership and hands back the row in one go
+    stmt = update(models.Income).values(**fields).returning(models.Income) if fields else select(models.Income)
+    result = await db.execute(stmt.where(*owned))
+    income = result.scalar_one_or_none()
 
     if not income:
         raise HTTPException(status_code=404, detail="Income not found")
 
-    if updated.amount is not None:
-        income.amount = updated.amount
-    if updated.source is not None:
-        income.source = updated.source
-    if updated.date is not None:
-        income.date = updated.date
-
-    db.commit()
-    db.refresh(income)
+    await db.commit()
+    invalidate_summary(current_user.id)
     return income
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models
-from app.database import get_db
+from app.database import get_async_db
 from app.utils import hash_password
-from app.auth import SECRET_KEY, ALGORITHM
+from app.auth import SECRET_KEY_BYTES, ALGORITHM, create_reset_token, invalidate_user_cache
 from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
-from jose import jwt, JWTError
-import random
-import string
+import jwt
+from jwt import InvalidTokenError
+import secrets
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -28,36 +30,23 @@ class ResetPasswordRequest(BaseModel):
 
 # ── Helper ─────────────────────────────────────────────────────────────────────
 def generate_otp(length: int = 6) -> str:
-    return "".join(random.choices(string.digits, k=length))
-
-
-def create_reset_token(email: str) -> str:
-    """Create a short-lived reset token (5 min) — bypasses create_access_token type restriction."""
-    expire = datetime.utcnow() + timedelta(minutes=5)
-    data = {
-        "user_email": email,
-        "purpose":    "password_reset",
-        "exp":        expire,
-        "type":       "password_reset"
-    }
-    return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
+    return f"{secrets.randbelow(10**length):0{length}d}"
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # STEP 1 — POST /api/auth/forgot-password
 # ══════════════════════════════════════════════════════════════════════════════
 @router.post("/forgot-password")
-def forgot_password(payload: ForgotPasswordRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == payload.email).first()
+async def forgot_password(payload: ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == payload.email))
     if not user:
         raise HTTPException(status_code=404, detail="No account found with this email")
 
     # Invalidate any old unused OTPs for this email
-    db.query(models.PasswordResetOTP).filter(
+    await db.execute(delete(models.PasswordResetOTP).where(
         models.PasswordResetOTP.email == payload.email,
         models.PasswordResetOTP.used  == False
-    ).delete()
-    db.commit()
+    ))
 
     otp        = generate_otp()
     expires_at = datetime.utcnow() + timedelta(minutes=10)
@@ -68,7 +57,7 @@ def forgot_password(payload: ForgotPasswordRequest, db: Session = Depends(get_db
         expires_at = expires_at,
         used       = False
     ))
-    db.commit()
+    await db.commit()
 
     return {
         "message":            "OTP generated successfully",
@@ -81,12 +70,12 @@ def forgot_password(payload: ForgotPasswordRequest, db: Session = Depends(get_db
 # STEP 2 — POST /api/auth/verify-otp
 # ══════════════════════════════════════════════════════════════════════════════
 @router.post("/verify-otp")
-def verify_otp(payload: VerifyOTPRequest, db: Session = Depends(get_db)):
-    record = db.query(models.PasswordResetOTP).filter(
+async def verify_otp(payload: VerifyOTPRequest, db: AsyncSession = Depends(get_async_db)):
+    record = await db.scalar(select(models.PasswordResetOTP).where(
         models.PasswordResetOTP.email == payload.email,
         models.PasswordResetOTP.otp   == payload.otp,
         models.PasswordResetOTP.used  == False
-    ).first()
+    ).limit(1))
 
     if not record:
         raise HTTPException(status_code=400, detail="Invalid OTP")
@@ -95,7 +84,7 @@ def verify_otp(payload: VerifyOTPRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="OTP expired. Please request a new one.")
 
     record.used = True
-    db.commit()
+    await db.commit()
 
     reset_token = create_reset_token(payload.email)
 
@@ -109,25 +98,27 @@ def verify_otp(payload: VerifyOTPRequest, db: Session = Depends(get_db)):
 # STEP 3 — POST /api/auth/reset-password
 # ══════════════════════════════════════════════════════════════════════════════
 @router.post("/reset-password")
-def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_db)):
+async def reset_password(payload: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     try:
-        data = jwt.decode(payload.reset_token, SECRET_KEY, algorithms=[ALGORITHM])
+        data = jwt.decode(payload.reset_token, SECRET_KEY_BYTES, algorithms=[ALGORITHM])
         if data.get("purpose") != "password_reset":
             raise HTTPException(status_code=400, detail="Invalid reset token")
         email = data.get("user_email")
         if not email:
             raise HTTPException(status_code=400, detail="Invalid reset token")
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=400, detail="Reset token is invalid or expired")
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == email))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if len(payload.new_password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
 
-    user.password = hash_password(payload.new_password)
-    db.commit()
+    # argon2 is CPU-bound; keep it off the event loop
+    user.password = await run_in_threadpool(hash_password, payload.new_password)
+    await db.commit()
+    invalidate_user_cache(user.id)
 
     return {"message": "Password reset successfully. You can now log in."}
\ No newline at end of file
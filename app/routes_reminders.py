@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select, update
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from typing import List
+import logging
 
 from app import models, schemas
-from app.database import get_db
+from app.database import get_async_db
 from app.auth import get_current_user
+from app.routes_summary import adjust_totals, invalidate_summary
 router = APIRouter(prefix="/reminders", tags=["reminders"])
+logger = logging.getLogger(__name__)
+
+# Serialises reminder lists in one pydantic-core pass. Routes that return its
+# bytes keep response_model only to document the shape in the OpenAPI schema.
+_REMINDER_LIST = TypeAdapter(List[schemas.RecurringReminderOut])
 
 # router = APIRouter(prefix="/reminders", tags=["reminders"])
 # @router.get("/")
@@ -37,55 +46,49 @@ def calculate_next_payment_date(day_of_month: int, frequency: str = "monthly") -
     return today + timedelta(days=30)
 
 
-# Get all reminders
 # Get all reminders
 @router.get("/", response_model=List[schemas.RecurringReminderOut])
-def get_reminders(
-    db: Session = Depends(get_db),
+async def get_reminders(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    print("="*50)
-    print("📋 GET REMINDERS REQUEST")
-    print(f"User ID: {current_user.id}")
-    
-    reminders = (
-        db.query(models.RecurringReminder)
-        .filter(models.RecurringReminder.user_id == current_user.id)
-        .filter(models.RecurringReminder.is_active == True)
-        .order_by(models.RecurringReminder.day_of_month)
-        .all()
+    reminder = models.RecurringReminder
+    result = await db.execute(
+        select(*(getattr(reminder, f) for f in schemas.RecurringReminderOut.model_fields))
+        .where(reminder.user_id == current_user.id)
+        .where(reminder.is_active == True)
+        .order_by(reminder.day_of_month)
     )
+    rows = result.all()
     
-    print(f"Found {len(reminders)} reminders")
-    for r in reminders:
-        print(f"  - ID: {r.id}, Name: {r.name}, Amount: {r.amount}, Day: {r.day_of_month}")
-    print("="*50)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📋 reminders user=%s count=%d", current_user.id, len(rows))
+        for r in rows:
+            logger.debug("  - ID: %s, Name: %s, Amount: %s, Day: %s", r.id, r.name, r.amount, r.day_of_month)
     
-    return reminders
+    reminders = [schemas.RecurringReminderOut.from_orm_trusted(r) for r in rows]
+    return Response(_REMINDER_LIST.dump_json(reminders), media_type="application/json")
 
 # Get single reminder
 @router.get("/{reminder_id}", response_model=schemas.RecurringReminderOut)
-def get_reminder(
+async def get_reminder(
     reminder_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    reminder = db.query(models.RecurringReminder).filter(
-        models.RecurringReminder.id == reminder_id,
-        models.RecurringReminder.user_id == current_user.id
-    ).first()
+    reminder = await db.get(models.RecurringReminder, reminder_id)
     
-    if not reminder:
+    if not reminder or reminder.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
-    return reminder
+    return schemas.RecurringReminderOut.from_orm_trusted(reminder)
 
 
 # Create reminder
 @router.post("/", response_model=schemas.RecurringReminderOut)
-def create_reminder(
+async def create_reminder(
     reminder: schemas.RecurringReminderCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Validate day of month
@@ -95,119 +98,125 @@ def create_reminder(
     # Calculate next payment date
     next_payment = calculate_next_payment_date(reminder.day_of_month, reminder.frequency)
     
-    new_reminder = models.RecurringReminder(
-        user_id=current_user.id,
-        name=reminder.name,
-        amount=reminder.amount,
-        category=reminder.category,
-        day_of_month=reminder.day_of_month,
-        frequency=reminder.frequency,
-        notify_7_days=reminder.notify_7_days,
-        notify_3_days=reminder.notify_3_days,
-        notify_1_day=reminder.notify_1_day,
-        notify_same_day=reminder.notify_same_day,
-        auto_pay=reminder.auto_pay,
-        next_payment_date=next_payment
+    result = await db.execute(
+        insert(models.RecurringReminder)
+        .values(
+            user_id=current_user.id,
+            name=reminder.name,
+            amount=reminder.amount,
+            category=reminder.category,
+            day_of_month=reminder.day_of_month,
+            frequency=reminder.frequency,
+            notify_7_days=reminder.notify_7_days,
+            notify_3_days=reminder.notify_3_days,
+            notify_1_day=reminder.notify_1_day,
+            notify_same_day=reminder.notify_same_day,
+            auto_pay=reminder.auto_pay,
+            next_payment_date=next_payment
+        )
+        .returning(models.RecurringReminder)
     )
-    
-    db.add(new_reminder)
-    db.commit()
-    db.refresh(new_reminder)
+    new_reminder = result.scalar_one()
+    await db.commit()
     
     return new_reminder
 
 
 # Update reminder
 @router.put("/{reminder_id}", response_model=schemas.RecurringReminderOut)
-def update_reminder(
+async def update_reminder(
     reminder_id: int,
     reminder_update: schemas.RecurringReminderUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    reminder = db.query(models.RecurringReminder).filter(
+    owned = (
         models.RecurringReminder.id == reminder_id,
-        models.RecurringReminder.user_id == current_user.id
-    ).first()
+        models.RecurringReminder.user_id == current_user.id,
+    )
+    
+    # Update fields; UPDATE ... RETURNING checks ownership and returns the row
+    update_data = reminder_update.model_dump(exclude_unset=True)
+    if update_data:
+        stmt = update(models.RecurringReminder).values(**update_data).returning(models.RecurringReminder)
+    else:
+        stmt = select(models.RecurringReminder)
+    result = await db.execute(stmt.where(*owned))
+    reminder = result.scalar_one_or_none()
     
     if not reminder:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
-    # Update fields
-    update_data = reminder_update.dict(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(reminder, field, value)
-    
-    # Recalculate next payment if day changed
+    # Recalculate next payment if day changed (needs the stored frequency)
     if reminder_update.day_of_month:
         reminder.next_payment_date = calculate_next_payment_date(
             reminder.day_of_month, 
             reminder.frequency
         )
     
-    db.commit()
-    db.refresh(reminder)
+    await db.commit()
     
     return reminder
 
 
 # Delete (deactivate) reminder
 @router.delete("/{reminder_id}")
-def delete_reminder(
+async def delete_reminder(
     reminder_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    reminder = db.query(models.RecurringReminder).filter(
-        models.RecurringReminder.id == reminder_id,
-        models.RecurringReminder.user_id == current_user.id
-    ).first()
+    # Soft delete
+    result = await db.execute(
+        update(models.RecurringReminder)
+        .where(
+            models.RecurringReminder.id == reminder_id,
+            models.RecurringReminder.user_id == current_user.id,
+        )
+        .values(is_active=False)
+        .returning(models.RecurringReminder.id)
+    )
     
-    if not reminder:
+    if result.first() is None:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
-    # Soft delete
-    reminder.is_active = False
-    db.commit()
+    await db.commit()
     
     return {"message": "Reminder deleted successfully"}
 
 
 # Get upcoming reminders (next 30 days)
 @router.get("/upcoming/list", response_model=List[schemas.RecurringReminderOut])
-def get_upcoming_reminders(
-    db: Session = Depends(get_db),
+async def get_upcoming_reminders(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     today = datetime.now()
     next_month = today + timedelta(days=30)
     
-    reminders = (
-        db.query(models.RecurringReminder)
-        .filter(models.RecurringReminder.user_id == current_user.id)
-        .filter(models.RecurringReminder.is_active == True)
-        .filter(models.RecurringReminder.next_payment_date <= next_month)
-        .order_by(models.RecurringReminder.next_payment_date)
-        .all()
+    reminder = models.RecurringReminder
+    result = await db.execute(
+        select(*(getattr(reminder, f) for f in schemas.RecurringReminderOut.model_fields))
+        .where(reminder.user_id == current_user.id)
+        .where(reminder.is_active == True)
+        .where(reminder.next_payment_date <= next_month)
+        .order_by(reminder.next_payment_date)
     )
     
-    return reminders
+    reminders = [schemas.RecurringReminderOut.from_orm_trusted(r) for r in result]
+    return Response(_REMINDER_LIST.dump_json(reminders), media_type="application/json")
 
 
 # Mark reminder as paid (creates expense and updates next date)
 @router.post("/{reminder_id}/mark-paid")
-def mark_reminder_paid(
+async def mark_reminder_paid(
     reminder_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    reminder = db.query(models.RecurringReminder).filter(
-        models.RecurringReminder.id == reminder_id,
-        models.RecurringReminder.user_id == current_user.id
-    ).first()
+    reminder = await db.get(models.RecurringReminder, reminder_id)
     
-    if not reminder:
+    if not reminder or reminder.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
     # Create expense
@@ -220,15 +229,77 @@ def mark_reminder_paid(
     )
     
     db.add(new_expense)
+    await db.execute(adjust_totals(current_user.id, expenses=reminder.amount))
     
     # Update next payment date
     if reminder.frequency == "monthly":
         reminder.next_payment_date = reminder.next_payment_date + relativedelta(months=1)
     
-    db.commit()
+    await db.commit()
+    invalidate_summary(current_user.id)
     
     return {
         "message": "Reminder marked as paid",
         "expense_id": new_expense.id,
         "next_payment_date": reminder.next_payment_date
-    }
\ No newline at end of file
+    }
+
+
+# Mark several reminders as paid at once: one multi-row INSERT for the
+# expenses and one executemany UPDATE for the reminders
+@router.post("/bulk-mark-paid")
+async def bulk_mark_reminders_paid(
+    ids: List[int],
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(
+            models.RecurringReminder.id,
+            models.RecurringReminder.amount,
+            models.RecurringReminder.category,
+            models.RecurringReminder.frequency,
+            models.RecurringReminder.next_payment_date,
+        )
+        .where(models.RecurringReminder.id.in_(ids))
+        .where(models.RecurringReminder.user_id == current_user.id)
+    )
+    reminders = result.all()
+    if not reminders:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    
+    now = datetime.now()
+    result = await db.execute(
+        insert(models.Expense).returning(models.Expense.id, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": current_user.id,
+                "amount": r.amount,
+                "category": r.category,
+                "date": now,
+                "is_auto": False,  # Manual confirmation
+            }
+            for r in reminders
+        ],
+    )
+    expense_ids = result.scalars().all()
+    await db.execute(
+        adjust_totals(current_user.id, expenses=sum(r.amount for r in reminders))
+    )
+    
+    next_dates = [
+        {"id": r.id, "next_payment_date": r.next_payment_date + relativedelta(months=1)}
+        for r in reminders
+        if r.frequency == "monthly"
+    ]
+    if next_dates:
+        await db.execute(update(models.RecurringReminder), next_dates)
+    
+    await db.commit()
+    invalidate_summary(current_user.id)
+    
+    return {
+        "message": "Reminders marked as paid",
+        "reminder_ids": [r.id for r in reminders],
+        "expense_ids": expense_ids,
+    }
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Response
+from typing import List
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import orjson
 
-from app.database import get_db
+from app.database import get_async_db
 from app.auth import get_current_user
+from app.routes_summary import adjust_totals, invalidate_summary
 from app import models
 router = APIRouter(
     prefix="/suggestions",
@@ -11,32 +15,33 @@ router = APIRouter(
 
 
 @router.get("/")
-def get_suggestions(
-    db: Session = Depends(get_db),
+async def get_suggestions(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return (
-        db.query(models.ExpenseSuggestion)
-        .filter(
+    result = await db.execute(
+        select(models.ExpenseSuggestion.__table__)
+        .where(
             models.ExpenseSuggestion.user_id == current_user.id,
             models.ExpenseSuggestion.status == "pending"
         )
-        .all()
+    )
+    # Plain rows encoded straight to bytes: no ORM instances, no jsonable_encoder
+    return Response(
+        orjson.dumps([dict(row._mapping) for row in result]),
+        media_type="application/json",
     )
 
 
 @router.post("/{suggestion_id}/confirm")
-def confirm_suggestion(
+async def confirm_suggestion(
     suggestion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    s = db.query(models.ExpenseSuggestion).filter(
-        models.ExpenseSuggestion.id == suggestion_id,
-        models.ExpenseSuggestion.user_id == current_user.id
-    ).first()
+    s = await db.get(models.ExpenseSuggestion, suggestion_id)
 
-    if not s:
+    if not s or s.user_id != current_user.id:
         return {"message": "Suggestion not found"}
 
     # Add expense
@@ -49,26 +54,63 @@ def confirm_suggestion(
     s.status = "confirmed"
 
     db.add(expense)
-    db.commit()
+    await db.execute(adjust_totals(current_user.id, expenses=s.suggested_amount))
+    await db.commit()
+    invalidate_summary(current_user.id)
 
     return {"message": "Suggestion confirmed"}
 
 
 @router.post("/{suggestion_id}/reject")
-def reject_suggestion(
+async def reject_suggestion(
     suggestion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    s = db.query(models.ExpenseSuggestion).filter(
-        models.ExpenseSuggestion.id == suggestion_id,
-        models.ExpenseSuggestion.user_id == current_user.id
-    ).first()
+    s = await db.get(models.ExpenseSuggestion, suggestion_id)
 
-    if not s:
+    if not s or s.user_id != current_user.id:
         return {"message": "Suggestion not found"}
 
     s.status = "rejected"
-    db.commit()
+    await db.commit()
 
     return {"message": "Suggestion rejected"}
+
+
+@router.post("/bulk-confirm")
+async def bulk_confirm_suggestions(
+    ids: List[int],
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    # Claim the still-pending suggestions and book them with one multi-row INSERT
+    result = await db.execute(
+        update(models.ExpenseSuggestion)
+        .where(
+            models.ExpenseSuggestion.id.in_(ids),
+            models.ExpenseSuggestion.user_id == current_user.id,
+            models.ExpenseSuggestion.status == "pending"
+        )
+        .values(status="confirmed")
+        .returning(models.ExpenseSuggestion.suggested_amount, models.ExpenseSuggestion.category)
+    )
+    confirmed = result.all()
+
+    if not confirmed:
+        return {"message": "Suggestion not found"}
+
+    await db.execute(
+        insert(models.Expense),
+        [
+            {"user_id": current_user.id, "amount": s.suggested_amount, "category": s.category}
+            for s in confirmed
+        ],
+    )
+    await db.execute(
+        adjust_totals(current_user.id, expenses=sum(s.suggested_amount for s in confirmed))
+    )
+    await db.commit()
+    invalidate_summary(current_user.id)
+
+    return {"message": "Suggestions confirmed", "count": len(confirmed)}
@@ -1,42 +1,70 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 from datetime import datetime
-from app.database import get_db
+from cachetools import TTLCache
+import threading
+from app.database import get_async_db
 from app.auth import get_current_user
 from app import models
 
 router = APIRouter(prefix="/summary", tags=["summary"])
 
+# The dashboard asks for the summary on every navigation. Keep each user's
+# result briefly; routes that write income or expenses call invalidate_summary
+# after committing. Sync routes invalidate from the threadpool, hence the lock.
+_summary_cache = TTLCache(maxsize=10_000, ttl=30)
+_summary_lock = threading.Lock()
+
+
+def invalidate_summary(user_id: int):
+    with _summary_lock:
+        _summary_cache.pop(user_id, None)
+
+
+def adjust_totals(user_id: int, income: float = 0.0, expenses: float = 0.0):
+    """
+    UPDATE moving the user's running totals by the given deltas.
+    Execute it in the same transaction as the Income/Expense write it mirrors.
+    """
+    return (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(
+            total_income=models.User.total_income + income,
+            total_expenses=models.User.total_expenses + expenses,
+        )
+    )
+
 
 @router.get("/")
-def get_summary(
-    db: Session = Depends(get_db),
+async def get_summary(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Get financial summary: total income, total expenses, and savings
     """
-    # Calculate total income
-    total_income = (
-        db.query(func.sum(models.Income.amount))
-        .filter(models.Income.user_id == current_user.id)
-        .scalar() or 0.0
-    )
-    
-    # Calculate total expenses
-    total_expenses = (
-        db.query(func.sum(models.Expense.amount))
-        .filter(models.Expense.user_id == current_user.id)
-        .scalar() or 0.0
+    with _summary_lock:
+        cached = _summary_cache.get(current_user.id)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(models.User.total_income, models.User.total_expenses)
+        .where(models.User.id == current_user.id)
     )
+    total_income, total_expenses = result.one()
     
     # Calculate savings (income - expenses)
     savings = total_income - total_expenses
     
-    return {
+    summary = {
         "total_income": round(float(total_income), 2),
         "total_expenses": round(float(total_expenses), 2),
         "savings": round(float(savings), 2)
     }
+    with _summary_lock:
+        _summary_cache[current_user.id] = summary
+    return summary
 
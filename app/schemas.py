@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
 from datetime import datetime
 
@@ -70,8 +70,12 @@ class ExpenseOut(BaseModel):
     date: datetime
     is_auto: bool
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_orm_trusted(cls, obj) -> "ExpenseOut":
+        """Build from an ORM object or row we read ourselves, skipping validation"""
+        return cls.model_construct(**{f: getattr(obj, f) for f in cls.model_fields})
 
 
 # ---------- GOALS ----------
@@ -110,6 +114,18 @@ class DetectedTransactionUpdate(BaseModel):
     status: Optional[str] = None
 
 
+class PendingTransactionOut(BaseModel):
+    id: int
+    amount: float
+    merchant: Optional[str] = None
+    category_guess: Optional[str] = None
+    transaction_date: datetime
+    sms_hash: str
+    status: str
+    transaction_type: str
+    credit_source: str = ""
+
+
 # ---------- REMINDERS ----------
 class RecurringReminderCreate(BaseModel):
     name: str
@@ -154,5 +170,9 @@ class RecurringReminderOut(BaseModel):
     next_payment_date: Optional[datetime]
     created_at: datetime
 
-    class Config:
-        from_attributes = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def from_orm_trusted(cls, obj) -> "RecurringReminderOut":
+        """Build from an ORM object or row we read ourselves, skipping validation"""
+        return cls.model_construct(**{f: getattr(obj, f) for f in cls.model_fields})
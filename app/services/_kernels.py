@@ -0,0 +1,131 @@
+"""
+Numeric kernels for MLService and pattern learning
+Compiled with Numba so per-month and per-category loops run as machine code over flat arrays
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def recent_category_stats(codes, spend, n_categories):
+    """
+    Walk monthly category spend rows (in time order) once and keep, per category,
+    the number of months seen and its last three values.
+    Returns (count, last, previous, mean_of_last_3), indexed by category code;
+    previous is NaN for categories seen in a single month.
+    """
+    count = np.zeros(n_categories, np.int64)
+    window = np.zeros((n_categories, 3), np.float64)  # ring buffer of last 3 months
+
+    for i in range(codes.shape[0]):
+        c = codes[i]
+        window[c, count[c] % 3] = spend[i]
+        count[c] += 1
+
+    last = np.empty(n_categories, np.float64)
+    previous = np.full(n_categories, np.nan)
+    mean_last_3 = np.empty(n_categories, np.float64)
+
+    for c in range(n_categories):
+        k = count[c]
+        last[c] = window[c, (k - 1) % 3]
+        if k >= 2:
+            previous[c] = window[c, (k - 2) % 3]
+
+        # Sum oldest-first so the result matches pandas' tail(3).mean()
+        m = min(k, 3)
+        total = 0.0
+        for j in range(k - m, k):
+            total += window[c, j % 3]
+        mean_last_3[c] = total / m
+
+    return count, last, previous, mean_last_3
+
+
+@njit(cache=True)
+def monthly_totals(month_ids, amounts):
+    """
+    Sum amounts per month in one pass over month ids sorted ascending (expenses
+    are loaded in date order).
+    Returns (months, totals, counts) for each month seen; totals use Kahan
+    summation like pandas' groupby sum.
+    """
+    n = month_ids.shape[0]
+    months = np.empty(n, np.int64)
+    totals = np.empty(n, np.float64)
+    counts = np.empty(n, np.int64)
+    k = -1
+    compensation = 0.0
+
+    for i in range(n):
+        if k < 0 or month_ids[i] != months[k]:
+            k += 1
+            months[k] = month_ids[i]
+            totals[k] = 0.0
+            counts[k] = 0
+            compensation = 0.0
+        y = amounts[i] - compensation
+        t = totals[k] + y
+        compensation = (t - totals[k]) - y
+        totals[k] = t
+        counts[k] += 1
+
+    return months[:k + 1], totals[:k + 1], counts[:k + 1]
+
+
+@njit(cache=True)
+def rolling_std(values, window):
+    """
+    Sample standard deviation over a trailing window, matching pandas'
+    rolling(window, min_periods=1).std(): NaN where the window holds one value.
+    """
+    n = values.shape[0]
+    out = np.empty(n, np.float64)
+
+    for i in range(n):
+        lo = max(0, i - window + 1)
+        m = i - lo + 1
+        if m < 2:
+            out[i] = np.nan
+            continue
+        mean = 0.0
+        for j in range(lo, i + 1):
+            mean += values[j]
+        mean /= m
+        ss = 0.0
+        for j in range(lo, i + 1):
+            ss += (values[j] - mean) ** 2
+        out[i] = np.sqrt(ss / (m - 1))
+
+    return out
+
+
+@njit(cache=True)
+def category_stats(codes, amounts, hours, n_categories):
+    """
+    Per-category count, amount sum/min/max and hour min/max in one pass.
+    Returns (count, total, min_amount, max_amount, min_hour, max_hour), indexed by category code.
+    """
+    count = np.zeros(n_categories, np.int64)
+    total = np.zeros(n_categories, np.float64)
+    min_amount = np.full(n_categories, np.inf)
+    max_amount = np.full(n_categories, -np.inf)
+    min_hour = np.full(n_categories, 23, np.int64)
+    max_hour = np.zeros(n_categories, np.int64)
+
+    for i in range(codes.shape[0]):
+        c = codes[i]
+        a = amounts[i]
+        h = hours[i]
+        count[c] += 1
+        total[c] += a
+        if a < min_amount[c]:
+            min_amount[c] = a
+        if a > max_amount[c]:
+            max_amount[c] = a
+        if h < min_hour[c]:
+            min_hour[c] = h
+        if h > max_hour[c]:
+            max_hour[c] = h
+
+    return count, total, min_amount, max_amount, min_hour, max_hour
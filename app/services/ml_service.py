@@ -2,18 +2,41 @@
 ML Service for SmartSpend AI Insights
 Implements real machine learning models for financial predictions
 """
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from cachetools import TTLCache
+import threading
+from functools import cached_property, wraps
+from itertools import islice
+from typing import Dict, List, Tuple
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from statistics import mean, stdev
-from collections import defaultdict
 
 from app import models
+from app.services._kernels import monthly_totals, recent_category_stats, rolling_std
+
+# The dashboard hits several /api/ai endpoints back to back; share one loaded
+# service per user across them until the user's expenses change.
+_service_cache = TTLCache(maxsize=1024, ttl=120)
+_service_lock = threading.Lock()
+
+
+def _computed_once(method):
+    """
+    Keep a result method's first answer on the service. generate_recommendations
+    and generate_alerts call the forecast and detectors again, and cached
+    services serve several requests, so each is only worked out once.
+    """
+    attr = f"_{method.__name__}_result"
+    
+    @wraps(method)
+    def wrapper(self):
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            result = self.__dict__[attr] = method(self)
+            return result
+    return wrapper
 
 
 class MLService:
@@ -25,14 +48,66 @@ class MLService:
         self.expenses = self._load_expenses()
         self.budgets = self._load_budgets()
     
-    def _load_expenses(self) -> List[models.Expense]:
-        """Load all expenses for the user"""
-        return (
-            self.db.query(models.Expense)
-            .filter(models.Expense.user_id == self.user_id)
+    @classmethod
+    def get(cls, db: Session, user_id: int) -> "MLService":
+        """
+        Return a cached service for the user, rebuilding it when an expense
+        was added, deleted or changed since it was loaded
+        """
+        version = tuple(
+            db.query(
+                func.count(models.Expense.id),
+                func.max(models.Expense.id),
+                func.sum(models.Expense.amount),
+            )
+            .filter(models.Expense.user_id == user_id)
+            .one()
+        )
+        cache_key = (user_id, version)
+        
+        with _service_lock:
+            service = _service_cache.get(cache_key)
+        if service is None:
+            service = cls(db, user_id)
+            service.db = None  # the request's session closes after this request
+            with _service_lock:
+                _service_cache[cache_key] = service
+        return service
+    
+    def _load_expenses(self) -> pd.DataFrame:
+        """Load the user's expenses as one date/amount/category frame shared by all methods"""
+        stmt = (
+            select(models.Expense.date, models.Expense.amount, models.Expense.category)
+            .where(models.Expense.user_id == self.user_id)
             .order_by(models.Expense.date.asc())
-            .all()
         )
+        rows = self.db.execute(stmt).all()
+        
+        # Column arrays straight from the row tuples: pandas builds each column
+        # from one array instead of sniffing types row by row. The ORM already
+        # hands back datetimes, so DatetimeIndex skips to_datetime's inference.
+        n = len(rows)
+        dates = pd.DatetimeIndex(np.fromiter((r[0] for r in rows), dtype=object, count=n))
+        self._dates = dates.values
+        self._amounts = np.fromiter((r[1] for r in rows), dtype=np.float64, count=n)
+        self._categories = np.fromiter((r[2] for r in rows), dtype=object, count=n)
+        
+        df = pd.DataFrame({
+            "date": dates,
+            "amount": self._amounts,
+            "category": self._categories,
+        })
+        # Months as int64 keys (months since 1970-01) rather than Period
+        # objects: cheaper to group on and usable directly by the kernels.
+        # Undated rows are left out of every per-month aggregate.
+        self._dated = ~np.isnat(self._dates)
+        df["month"] = self._dates.astype("datetime64[M]").astype(np.int64)
+        
+        # Whole-history aggregates read by the explanations and alerts
+        codes, self._category_names = pd.factorize(self._categories)
+        self._category_totals = np.bincount(codes, weights=self._amounts, minlength=len(self._category_names))
+        self._recent_amounts = self._amounts[-30:]
+        return df
     
     def _load_budgets(self) -> Dict[str, float]:
         """Load budgets from database (or return empty dict if not implemented)"""
@@ -40,67 +115,85 @@ class MLService:
         # TODO: Implement Budget model when migrating to database
         return {}
     
-    def _engineer_features(self) -> pd.DataFrame:
-        """Engineer features from expense data"""
+    @cached_property
+    def _monthly_features(self) -> pd.DataFrame:
+        """
+        Engineer monthly features from expense data; computed once per service
+        since forecast_next_month and explain_predictions both read them
+        """
         if len(self.expenses) < 3:
             return pd.DataFrame()
         
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            "date": e.date,
-            "amount": e.amount,
-            "category": e.category
-        } for e in self.expenses])
-        
-        df["date"] = pd.to_datetime(df["date"])
-        
         # Monthly aggregation
-        df["year_month"] = df["date"].dt.to_period("M")
-        monthly = df.groupby("year_month").agg({
-            "amount": "sum",
-            "category": lambda x: x.nunique(),  # unique categories
-        }).reset_index()
-        monthly.columns = ["month", "total_spend", "category_count"]
+        months, total_spend, transaction_count = self._month_totals
+        
+        monthly = pd.DataFrame({"month": months, "total_spend": total_spend})
         
         # Time features
         monthly["month_index"] = np.arange(len(monthly))
         
         # Trend features
-        if len(monthly) > 1:
-            monthly["spend_change"] = monthly["total_spend"].diff()
-            monthly["spend_pct_change"] = monthly["total_spend"].pct_change() * 100
-        else:
-            monthly["spend_change"] = 0
-            monthly["spend_pct_change"] = 0
+        monthly["spend_change"] = np.diff(total_spend, prepend=np.nan)
         
         # Volatility (rolling std)
-        if len(monthly) >= 3:
-            monthly["volatility"] = monthly["total_spend"].rolling(window=3, min_periods=1).std()
-        else:
-            monthly["volatility"] = monthly["total_spend"].std() if len(monthly) > 1 else 0
-        
-        # Category-wise features
-        category_monthly = df.groupby(["year_month", "category"])["amount"].sum().reset_index()
-        category_monthly.columns = ["month", "category", "category_spend"]
-        
-        # Day-of-week patterns
-        df["day_of_week"] = df["date"].dt.dayofweek
-        weekday_spend = df.groupby("day_of_week")["amount"].mean()
-        monthly["avg_weekday_spend"] = weekday_spend.mean() if len(weekday_spend) > 0 else 0
+        monthly["volatility"] = rolling_std(total_spend, 3)
         
         # Frequency (transactions per month)
-        monthly["transaction_count"] = df.groupby("year_month").size().values
+        monthly["transaction_count"] = transaction_count
         
         return monthly
     
+    @cached_property
+    def _month_totals(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(month keys, total spend, transaction count) per month, oldest first"""
+        month_ids = self.expenses["month"].values[self._dated]
+        return monthly_totals(month_ids, self._amounts[self._dated])
+    
+    @cached_property
+    def _spend_trend(self) -> str:
+        """
+        "UP", "DOWN" or "STABLE" from the least-squares slope over every month's
+        total rather than the last month-over-month change alone, which one
+        unusual month could flip. Shared by forecast_next_month and
+        explain_predictions so they never disagree.
+        """
+        _, y, _ = self._month_totals
+        if len(y) < 2:
+            return "STABLE"
+        t = np.arange(len(y)) - (len(y) - 1) / 2
+        slope = (t @ (y - y.mean())) / (t @ t)
+        relative_slope = slope / y.mean() if y.mean() > 0 else 0.0
+        if relative_slope > 0.05:  # >5% of an average month's spend, per month
+            return "UP"
+        if relative_slope < -0.05:
+            return "DOWN"
+        return "STABLE"
+    
+    @cached_property
+    def _category_recent_stats(self) -> Tuple[pd.Index, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Monthly spend per category reduced to parallel arrays (categories, months_seen,
+        last, previous, mean_of_last_3), in order of first appearance. One groupby and
+        one kernel pass shared by detect_budget_risks and detect_overspending_patterns.
+        """
+        df = self.expenses if self._dated.all() else self.expenses[self._dated]
+        category_monthly = df.groupby(["month", "category"], as_index=False).agg(spend=("amount", "sum"))
+        codes, categories = pd.factorize(category_monthly["category"])
+        count, last, previous, mean_last_3 = recent_category_stats(
+            np.ascontiguousarray(codes, dtype=np.int64),
+            np.ascontiguousarray(category_monthly["spend"].values, dtype=np.float64),
+            len(categories),
+        )
+        return categories, count, last, previous, mean_last_3
+    
+    @_computed_once
     def forecast_next_month(self) -> Dict:
         """
         Predict next month's total spending using ML models
         Returns: {predicted_amount, confidence, trend}
         """
-        monthly = self._engineer_features()
-        
-        if len(monthly) < 3:
+        months, _, _ = self._month_totals
+        if len(months) < 3:
             return {
                 "predicted_amount": 0,
                 "confidence": 0.0,
@@ -108,6 +201,8 @@ class MLService:
                 "message": "Insufficient data (need at least 3 months)"
             }
         
+        monthly = self._monthly_features
+        
         # Prepare features
         X = monthly[["month_index", "total_spend", "spend_change", "volatility", "transaction_count"]].fillna(0)
         y = monthly["total_spend"].values
@@ -116,15 +211,26 @@ class MLService:
         models_list = []
         predictions = []
         
-        # Linear Regression
-        lr = LinearRegression()
-        lr.fit(X[:-1], y[:-1])  # Leave last month for validation
-        lr_pred = lr.predict(X.iloc[[-1]].values)[0]
-        models_list.append(("LinearRegression", lr, lr_pred))
+        # Linear Regression: ordinary least squares solved directly with NumPy.
+        # Centering before lstsq fits the intercept the same way sklearn's
+        # LinearRegression does (same minimum-norm answer when there are fewer
+        # months than features) without its estimator overhead. rcond drops
+        # the rounding-noise singular values those short histories produce, so
+        # the fit doesn't swing on last-digit differences in the features.
+        Xm = np.asarray(X.values, dtype=np.float64)
+        X_train, y_train = Xm[:-1], y[:-1]  # Leave last month for validation
+        X_mean, y_mean = X_train.mean(axis=0), y_train.mean()
+        coef, *_ = np.linalg.lstsq(X_train - X_mean, y_train - y_mean, rcond=1e-10)
+        lr_pred = float((Xm[-1] - X_mean) @ coef + y_mean)
+        models_list.append(("LinearRegression", coef, lr_pred))
         predictions.append(lr_pred)
         
         # Random Forest (if enough data)
         if len(monthly) >= 5:
+            # Imported here so workers that never forecast 5+ months of data
+            # don't pay for loading sklearn.ensemble
+            from sklearn.ensemble import RandomForestRegressor
+            
             rf = RandomForestRegressor(n_estimators=50, random_state=42, max_depth=3)
             rf.fit(X[:-1], y[:-1])
             rf_pred = rf.predict(X.iloc[[-1]].values)[0]
@@ -144,24 +250,13 @@ class MLService:
         else:
             confidence = min(0.85, max(0.3, len(monthly) / 12))
         
-        # Determine trend
-        if len(monthly) >= 2:
-            recent_trend = monthly["spend_change"].iloc[-1]
-            if recent_trend > monthly["total_spend"].iloc[-2] * 0.05:  # >5% increase
-                trend = "UP"
-            elif recent_trend < -monthly["total_spend"].iloc[-2] * 0.05:  # >5% decrease
-                trend = "DOWN"
-            else:
-                trend = "STABLE"
-        else:
-            trend = "STABLE"
-        
         return {
             "predicted_amount": round(float(max(0, predicted_amount)), 2),
             "confidence": round(float(confidence), 2),
-            "trend": trend
+            "trend": self._spend_trend
         }
     
+    @_computed_once
     def detect_budget_risks(self) -> List[Dict]:
         """
         Compare ML predictions vs budgets to detect risks
@@ -170,61 +265,39 @@ class MLService:
         if len(self.expenses) < 3:
             return []
         
-        # Get category-wise predictions
-        df = pd.DataFrame([{
-            "date": e.date,
-            "amount": e.amount,
-            "category": e.category
-        } for e in self.expenses])
+        categories, months, last, previous, recent_avg = self._category_recent_stats
         
-        df["date"] = pd.to_datetime(df["date"])
-        df["year_month"] = df["date"].dt.to_period("M")
+        # Get budget limit (from localStorage for now - would be from DB)
+        # For demo, we'll use a default or calculate from recent spending
+        budget_limit = recent_avg * 1.2  # Default 20% buffer
         
-        # Monthly category spending
-        category_monthly = df.groupby(["year_month", "category"])["amount"].sum().reset_index()
-        category_monthly.columns = ["month", "category", "spend"]
+        # Every category seen in 2+ months with a budget, as parallel arrays
+        idx = np.flatnonzero((months >= 2) & (budget_limit > 0))
         
-        risks = []
+        # Simple trend-based prediction for category
+        trend = last[idx] - previous[idx]
+        predicted = np.maximum(0, recent_avg[idx] + (trend * 0.5))
         
-        # For each category with budget, predict next month
-        categories = category_monthly["category"].unique()
+        # Calculate risk
+        probability = np.minimum(1.0, predicted / budget_limit[idx])
+        risk_level = np.where(probability >= 0.9, "HIGH", np.where(probability >= 0.7, "MEDIUM", "LOW"))
         
-        for category in categories:
-            cat_data = category_monthly[category_monthly["category"] == category]
-            
-            if len(cat_data) < 2:
-                continue
-            
-            # Simple trend-based prediction for category
-            recent_avg = cat_data["spend"].tail(3).mean()
-            trend = cat_data["spend"].tail(2).diff().iloc[-1] if len(cat_data) >= 2 else 0
-            predicted = max(0, recent_avg + (trend * 0.5))
-            
-            # Get budget limit (from localStorage for now - would be from DB)
-            # For demo, we'll use a default or calculate from recent spending
-            budget_limit = recent_avg * 1.2  # Default 20% buffer
-            
-            # Calculate risk
-            if budget_limit > 0:
-                probability = min(1.0, predicted / budget_limit)
-                
-                if probability >= 0.9:
-                    risk_level = "HIGH"
-                elif probability >= 0.7:
-                    risk_level = "MEDIUM"
-                else:
-                    risk_level = "LOW"
-                
-                risks.append({
-                    "category": category,
-                    "risk_level": risk_level,
-                    "probability": round(float(probability), 2),
-                    "expected_spend": round(float(predicted), 2),
-                    "budget_limit": round(float(budget_limit), 2)
-                })
+        risks = [
+            {
+                "category": categories[i],
+                "risk_level": str(level),
+                "probability": round(float(p), 2),
+                "expected_spend": round(float(e), 2),
+                "budget_limit": round(float(b), 2)
+            }
+            for i, level, p, e, b in zip(idx, risk_level, probability, predicted, budget_limit[idx])
+        ]
         
-        return sorted(risks, key=lambda x: x["probability"], reverse=True)
+        # Highest probability first; a stable argsort keeps ties in category order
+        order = np.argsort([-r["probability"] for r in risks], kind="stable")
+        return [risks[i] for i in order]
     
+    @_computed_once
     def detect_overspending_patterns(self) -> List[Dict]:
         """
         Detect anomalies: spikes, rapid growth, category explosions
@@ -233,25 +306,15 @@ class MLService:
         if len(self.expenses) < 4:
             return []
         
-        df = pd.DataFrame([{
-            "date": e.date,
-            "amount": e.amount,
-            "category": e.category
-        } for e in self.expenses])
-        
-        df["date"] = pd.to_datetime(df["date"])
-        df["year_month"] = df["date"].dt.to_period("M")
-        
         insights = []
         
         # Monthly totals
-        monthly = df.groupby("year_month")["amount"].sum().reset_index()
-        monthly.columns = ["month", "total"]
+        _, totals, _ = self._month_totals
         
-        if len(monthly) >= 2:
+        if len(totals) >= 2:
             # Detect spikes
-            recent = monthly["total"].iloc[-1]
-            previous = monthly["total"].iloc[-2]
+            recent = totals[-1]
+            previous = totals[-2]
             
             if recent > previous * 1.4:  # 40% increase
                 pct_increase = ((recent - previous) / previous) * 100
@@ -263,15 +326,8 @@ class MLService:
                 })
             
             # Category-wise spikes
-            category_monthly = df.groupby(["year_month", "category"])["amount"].sum().reset_index()
-            category_monthly.columns = ["month", "category", "spend"]
-            
-            for category in category_monthly["category"].unique():
-                cat_data = category_monthly[category_monthly["category"] == category]
-                if len(cat_data) >= 2:
-                    recent_cat = cat_data["spend"].iloc[-1]
-                    prev_cat = cat_data["spend"].iloc[-2]
-                    
+            for category, months, recent_cat, prev_cat, _ in zip(*self._category_recent_stats):
+                if months >= 2:
                     if prev_cat > 0 and recent_cat > prev_cat * 1.3:  # 30% increase
                         pct = ((recent_cat - prev_cat) / prev_cat) * 100
                         insights.append({
@@ -282,8 +338,8 @@ class MLService:
                         })
         
         # Rapid growth detection (3+ months)
-        if len(monthly) >= 3:
-            growth_rate = (monthly["total"].iloc[-1] / monthly["total"].iloc[-3]) - 1
+        if len(totals) >= 3:
+            growth_rate = (totals[-1] / totals[-3]) - 1
             if growth_rate > 0.3:  # 30% growth over 3 months
                 insights.append({
                     "type": "RAPID_GROWTH",
@@ -311,8 +367,8 @@ class MLService:
         
         # Recommendation 1: Based on forecast vs current
         if forecast["predicted_amount"] > 0 and len(self.expenses) > 0:
-            recent_expenses = [e.amount for e in self.expenses[-30:]]
-            current_avg = mean(recent_expenses) if recent_expenses else 0
+            recent_expenses = self._recent_amounts
+            current_avg = float(recent_expenses.mean()) if len(recent_expenses) else 0
             if current_avg > 0 and forecast["predicted_amount"] > current_avg * 1.2:
                 diff = forecast["predicted_amount"] - current_avg
                 recommendations.append({
@@ -321,8 +377,9 @@ class MLService:
                 })
         
         # Recommendation 2: Based on high-risk categories
-        high_risk = [r for r in risks if r["risk_level"] == "HIGH"]
-        for risk in high_risk[:2]:  # Top 2
+        # risks is sorted by probability, so stop at the first two HIGH ones
+        high_risk = (r for r in risks if r["risk_level"] == "HIGH")
+        for risk in islice(high_risk, 2):  # Top 2
             reduction = risk["expected_spend"] - risk["budget_limit"]
             if reduction > 0:
                 recommendations.append({
@@ -353,36 +410,40 @@ class MLService:
         """
         reasons = []
         
-        monthly = self._engineer_features()
+        monthly = self._monthly_features
         
         if len(monthly) < 2:
             return {
                 "reasons": ["Insufficient historical data for detailed analysis."]
             }
         
-        # Reason 1: Trend analysis
+        # Reason 1: Trend analysis, the same call forecast_next_month reports
         if len(monthly) >= 3:
-            recent_trend = monthly["spend_change"].tail(3).mean()
-            if recent_trend > 0:
-                months_increasing = sum(monthly["spend_change"].tail(3) > 0)
+            trend = self._spend_trend
+            if trend == "UP":
+                months_increasing = int((monthly["spend_change"].values[-3:] > 0).sum())
                 if months_increasing >= 2:
                     reasons.append(f"Spending has increased for {months_increasing} consecutive months")
-            elif recent_trend < 0:
+                else:
+                    reasons.append("Spending trend is increasing")
+            elif trend == "DOWN":
                 reasons.append("Spending trend is decreasing")
             else:
                 reasons.append("Spending trend is stable")
         
         # Reason 2: Weekend vs weekday
-        df = pd.DataFrame([{
-            "date": e.date,
-            "amount": e.amount
-        } for e in self.expenses])
-        df["date"] = pd.to_datetime(df["date"])
-        df["day_of_week"] = df["date"].dt.dayofweek
-        df["is_weekend"] = df["day_of_week"].isin([5, 6])
-        
-        weekend_avg = df[df["is_weekend"]]["amount"].mean() if len(df[df["is_weekend"]]) > 0 else 0
-        weekday_avg = df[~df["is_weekend"]]["amount"].mean() if len(df[~df["is_weekend"]]) > 0 else 0
+        # One mask over the raw arrays; 1970-01-01 was a Thursday (dayofweek 3).
+        # Undated expenses count as weekday spend, as before.
+        amounts = self._amounts
+        weekday = (self._dates.astype("datetime64[D]").astype(np.int64) + 3) % 7
+        is_weekend = self._dated & (weekday >= 5)
+        weekend_n = int(is_weekend.sum())
+        weekday_n = len(amounts) - weekend_n
+        weekend_sum = amounts[is_weekend].sum()
+        weekday_sum = amounts.sum() - weekend_sum
+        
+        weekend_avg = weekend_sum / weekend_n if weekend_n > 0 else 0
+        weekday_avg = weekday_sum / weekday_n if weekday_n > 0 else 0
         
         if weekend_avg > 0 and weekday_avg > 0:
             pct_diff = ((weekend_avg - weekday_avg) / weekday_avg) * 100
@@ -400,16 +461,15 @@ class MLService:
                 reasons.append("High spending volatility detected - expenses vary significantly month-to-month")
         
         # Reason 4: Category patterns
-        category_totals = defaultdict(float)
-        for e in self.expenses:
-            category_totals[e.category] += e.amount
-        
-        if category_totals:
-            top_category = max(category_totals.items(), key=lambda x: x[1])
-            total = sum(category_totals.values())
-            pct = (top_category[1] / total) * 100
+        category_totals = self._category_totals
+        
+        if len(category_totals) > 0:
+            top = category_totals.argmax()
+            top_category = self._category_names[top]
+            total = category_totals.sum()
+            pct = (category_totals[top] / total) * 100
             if pct > 40:
-                reasons.append(f"{top_category[0]} accounts for {pct:.0f}% of total spending")
+                reasons.append(f"{top_category} accounts for {pct:.0f}% of total spending")
         
         if not reasons:
             reasons.append("Analysis based on historical spending patterns and trends")
@@ -436,8 +496,8 @@ class MLService:
         # Alert 2: Forecast exceeds current spending significantly
         forecast = self.forecast_next_month()
         if forecast["predicted_amount"] > 0 and len(self.expenses) > 0:
-            recent_expenses = [e.amount for e in self.expenses[-30:]]
-            recent_avg = mean(recent_expenses) if recent_expenses else 0
+            recent_expenses = self._recent_amounts
+            recent_avg = float(recent_expenses.mean()) if len(recent_expenses) else 0
             if recent_avg > 0 and forecast["predicted_amount"] > recent_avg * 1.3:
                 alerts.append({
                     "alert_type": "FORECAST_EXCEED",
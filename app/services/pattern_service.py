@@ -1,63 +1,76 @@
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
-from collections import defaultdict
-from statistics import mean
 from datetime import datetime
+import numpy as np
 
 from app import models
+from app.services._kernels import category_stats
 def learn_expense_patterns(db: Session, user_id: int):
-    expenses = db.query(models.Expense)\
-        .filter(models.Expense.user_id == user_id)\
-        .all()
+    rows = db.execute(
+        select(models.Expense.category, models.Expense.amount, models.Expense.date)
+        .where(models.Expense.user_id == user_id)
+    ).all()
 
-    if len(expenses) < 5:
+    if len(rows) < 5:
         return
 
-    grouped = defaultdict(list)
+    n = len(rows)
+    categories = np.fromiter((r[0] for r in rows), dtype=object, count=n)
+    amounts = np.fromiter((r[1] for r in rows), dtype=np.float64, count=n)
+    hours = np.fromiter(
+        (r[2].hour if hasattr(r[2], "hour") else 12 for r in rows), dtype=np.int8, count=n
+    )
 
-    for e in expenses:
-        grouped[e.category].append(e)
+    # Per-category count/sum/min/max in one compiled pass over all rows, so
+    # the Python loop below runs once per category rather than per expense
+    uniq, first_seen, inv = np.unique(categories, return_index=True, return_inverse=True)
+    counts, sums, min_amounts, max_amounts, min_hours, max_hours = category_stats(
+        inv.astype(np.int64), amounts, hours, len(uniq)
+    )
 
-    for category, items in grouped.items():
-        if len(items) < 5:
+    existing = dict(db.execute(
+        select(models.ExpensePattern.category, models.ExpensePattern.id)
+        .where(models.ExpensePattern.user_id == user_id)
+    ).all())
+    to_insert = []
+    to_update = []
+
+    for i in np.argsort(first_seen):  # categories in order of first appearance
+        count = int(counts[i])
+        if count < 5:
             continue
 
-        amounts = [e.amount for e in items]
-        avg_amt = mean(amounts)
+        category = uniq[i]
+        avg_amt = float(sums[i]) / count
+        min_amt = float(min_amounts[i])
+        max_amt = float(max_amounts[i])
 
-        if max(amounts) - min(amounts) > avg_amt * 0.6:
+        if max_amt - min_amt > avg_amt * 0.6:
             continue  # too much variance
 
-        hours = [e.date.hour if hasattr(e.date, "hour") else 12 for e in items]
-
-        start_hour = max(min(hours) - 1, 0)
-        end_hour = min(max(hours) + 1, 23)
+        start_hour = max(int(min_hours[i]) - 1, 0)
+        end_hour = min(int(max_hours[i]) + 1, 23)
 
-        confidence = min(len(items) / 10, 1.0)
+        confidence = min(count / 10, 1.0)
 
-        existing = db.query(models.ExpensePattern).filter(
-            models.ExpensePattern.user_id == user_id,
-            models.ExpensePattern.category == category
-        ).first()
-
-        if existing:
-            existing.avg_amount = avg_amt
-            existing.min_amount = min(amounts)
-            existing.max_amount = max(amounts)
-            existing.preferred_hour_start = start_hour
-            existing.preferred_hour_end = end_hour
-            existing.confidence = confidence
+        values = {
+            "avg_amount": avg_amt,
+            "min_amount": min_amt,
+            "max_amount": max_amt,
+            "preferred_hour_start": start_hour,
+            "preferred_hour_end": end_hour,
+            "confidence": confidence,
+        }
+        pattern_id = existing.get(category)
+        if pattern_id is not None:
+            to_update.append({"id": pattern_id, **values})
         else:
-            pattern = models.ExpensePattern(
-                user_id=user_id,
-                category=category,
-                avg_amount=avg_amt,
-                min_amount=min(amounts),
-                max_amount=max(amounts),
-                preferred_hour_start=start_hour,
-                preferred_hour_end=end_hour,
-                frequency="daily",
-                confidence=confidence
-            )
-            db.add(pattern)
+            to_insert.append({"user_id": user_id, "category": category, "frequency": "daily", **values})
+
+    # Two executemany statements instead of a SELECT plus INSERT/UPDATE per category
+    if to_insert:
+        db.execute(insert(models.ExpensePattern), to_insert)
+    if to_update:
+        db.execute(update(models.ExpensePattern), to_update)
 
     db.commit()
@@ -3,9 +3,101 @@ SMS Parser Service
 Extracts transaction data from SMS notifications
 Supports: PhonePe, GPay, Bank SMS, Credit Card SMS
 """
+import hashlib
 import re
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Compiled once at import; re.search(pattern_string, ...) pays a cache lookup per call
+
+def _any_of(words) -> re.Pattern:
+    """One alternation over literal keywords, so a substring check is a single scan"""
+    return re.compile("|".join(map(re.escape, words)))
+
+# Keywords every transaction SMS has at least one of
+_TXN_KEYWORDS_RE = _any_of([
+    "debited", "credited", "paid", "received",
+    "rs.", "rs ", "inr", "₹",
+    "transaction", "payment", "upi",
+    "balance", "account",
+])
+
+# Case-insensitive twin, run on the raw body to turn away non-transaction SMS
+# before lowercasing it. It accepts everything the check on the lowercased
+# body does (and a few exotic case folds more, like "ſ" for "s").
+_TXN_KEYWORDS_ANYCASE_RE = re.compile(_TXN_KEYWORDS_RE.pattern, re.IGNORECASE)
+
+# Credit keywords win over debit ones when both appear
+_CREDIT_RE = _any_of(["credited", "received", "deposit", "refund"])
+_DEBIT_RE = _any_of(["debited", "paid", "spent", "purchase", "withdrawal"])
+
+# Common merchant names, highest priority first: the first one found as a
+# substring wins
+_KNOWN_MERCHANTS = [
+    "phonepe", "gpay", "paytm", "amazon pay",
+    "zomato", "swiggy", "uber", "ola",
+    "amazon", "flipkart", "myntra",
+]
+
+# Category hints in the SMS text, checked in order
+_CATEGORY_HINTS = [
+    (_any_of(["food", "restaurant", "order"]), "Food"),
+    (_any_of(["taxi", "cab", "ride", "travel"]), "Travel"),
+    (_any_of(["bill", "electricity", "gas", "water"]), "Bills"),
+    (_any_of(["medicine", "pharmacy", "medical"]), "Medicine"),
+]
+
+# Masks digits out of an SMS's UTF-8 bytes to get its template (see
+# SMSParser._classify); a byte table is ~10x cheaper than a regex sub. ASCII
+# digit bytes never occur inside multi-byte characters.
+_DIGIT_MASK = bytes.maketrans(b"0123456789", b"##########")
+
+# Amount indicator required of every transaction SMS
+_TXN_AMOUNT_RE = re.compile(r'[₹]?\s*(\d+[.,]\d{2}|\d+)')
+
+# Patterns: ₹299, Rs. 299, INR 299, 299.00, etc. The second matches any run
+# of digits, so it also covers the "Rs"/"INR" forms and nothing after it can
+# ever be reached. Only the digits are captured, so a leading "₹" or spaces
+# would not change the result; leaving them (and IGNORECASE) out lets the
+# engine jump straight to digit runs.
+_AMOUNT_PATTERNS = [re.compile(p) for p in (
+    r'(\d+[.,]\d{2})',  # ₹299.00 or 299.00
+    r'(\d+)',  # ₹299 or 299, Rs. 299, INR 299
+)]
+
+# "paid to" or "at" patterns
+_MERCHANT_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'paid\s+to\s+([A-Za-z\s]+)',
+    r'at\s+([A-Za-z\s]+)',
+    r'to\s+([A-Za-z\s]+)',
+)]
+
+# Common date patterns in Indian SMS, parsed by _extract_date as fixed-width
+# fields. A "DD MMM YYYY" pattern used to follow; the numeric formats it was
+# tried against could never parse it, so it never produced a date.
+_DATE_PATTERNS = [re.compile(p) for p in (
+    r'(\d{2}[/-]\d{2}[/-]\d{4})',  # DD/MM/YYYY
+    r'(\d{2}[/-]\d{2}[/-]\d{2})',  # DD/MM/YY
+)]
+
+# Pattern: "A/c **1234" or "Account ending 1234"
+# Each pattern starts with a literal; the search is skipped when the SMS
+# doesn't contain it and otherwise starts at its first occurrence
+_ACCT_PATTERNS = [(literal, re.compile(p, re.IGNORECASE)) for literal, p in (
+    ("a/c", r'a/c\s*\*+\s*(\d{4})'),
+    ("account", r'account\s+ending\s+(\d{4})'),
+    ("ending", r'ending\s+(\d{4})'),
+    ("**", r'\*\*(\d{4})'),
+)]
+
+# Pattern: "Ref No: ABC123" or "Txn ID: 123456"
+_REF_PATTERNS = [(literal, re.compile(p, re.IGNORECASE)) for literal, p in (
+    ("ref", r'ref\s*(?:no|number)[:.]?\s*([A-Z0-9]+)'),
+    ("txn", r'txn\s*(?:id|ref)[:.]?\s*([A-Z0-9]+)'),
+    ("reference", r'reference[:.]?\s*([A-Z0-9]+)'),
+    ("upi", r'upi\s*ref\s*([A-Z0-9]+)'),
+)]
 
 
 class SMSParser:
@@ -73,10 +165,11 @@ class SMSParser:
             "reference_number": str
         } or None if not a transaction SMS
         """
-        sms_lower = sms_body.lower()
-        
-        # Check if it's a transaction SMS
-        if not SMSParser._is_transaction_sms(sms_lower):
+        # Check if it's a transaction SMS. This is _is_transaction_sms minus its
+        # digit check: _extract_amount below finds no amount without digits,
+        # so that scan would only be repeated. Both rejections run on the raw
+        # body so OTPs and promos never pay for the lowercase copy.
+        if not _TXN_KEYWORDS_ANYCASE_RE.search(sms_body):
             return None
         
         # Extract amount
@@ -84,23 +177,25 @@ class SMSParser:
         if not amount:
             return None
         
-        # Determine transaction type
-        transaction_type = SMSParser._detect_transaction_type(sms_lower)
-        
-        # Extract merchant
-        merchant = SMSParser._extract_merchant(sms_body, sms_lower)
+        # Transaction type, merchant and category don't depend on digits, so
+        # they are worked out once per template
+        classified = SMSParser._classify(
+            sms_body.encode("utf-8", "surrogatepass").translate(_DIGIT_MASK)
+        )
+        if classified is None:
+            return None
+        transaction_type, merchant, category_guess = classified
         
-        # Guess category
-        category_guess = SMSParser._guess_category(merchant, sms_lower)
+        sms_lower = sms_body.lower()
         
         # Extract date
         transaction_date = SMSParser._extract_date(sms_body) or datetime.utcnow()
         
         # Extract account number (last 4 digits)
-        account_number = SMSParser._extract_account_number(sms_body)
+        account_number = SMSParser._extract_account_number(sms_body, sms_lower)
         
         # Extract reference number
-        reference_number = SMSParser._extract_reference_number(sms_body)
+        reference_number = SMSParser._extract_reference_number(sms_body, sms_lower)
         
         return {
             "amount": amount,
@@ -112,37 +207,48 @@ class SMSParser:
             "reference_number": reference_number
         }
     
+    @staticmethod
+    def parse_many(messages: Iterable[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """
+        Parse a batch of (sms_body, sender) pairs
+        Returns one parse_sms result per message, in order
+        """
+        # re holds the GIL while matching, so a thread pool would not run
+        # these in parallel; one loop over the shared compiled patterns it is
+        parse = SMSParser.parse_sms
+        return [parse(sms_body, sender) for sms_body, sender in messages]
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _classify(template: bytes) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        (transaction_type, merchant, category_guess) of an SMS with its digits
+        masked as "#", or None if it has no transaction keyword.
+        Bank SMS are templated, so most messages repeat a template already
+        seen with only the amount, date and numbers changed.
+        """
+        template = template.decode("utf-8", "surrogatepass")
+        template_lower = template.lower()
+        if not _TXN_KEYWORDS_RE.search(template_lower):
+            return None
+        merchant = SMSParser._extract_merchant(template, template_lower)
+        return (
+            SMSParser._detect_transaction_type(template_lower),
+            merchant,
+            SMSParser._guess_category(merchant, template_lower),
+        )
+    
     @staticmethod
     def _is_transaction_sms(sms_lower: str) -> bool:
         """Check if SMS is a transaction notification"""
-        transaction_keywords = [
-            "debited", "credited", "paid", "received",
-            "rs.", "rs ", "inr", "₹",
-            "transaction", "payment", "upi",
-            "balance", "account"
-        ]
-        
-        # Must have amount indicator
-        has_amount = bool(re.search(r'[₹]?\s*(\d+[.,]\d{2}|\d+)', sms_lower))
-        
-        # Must have transaction keyword
-        has_keyword = any(keyword in sms_lower for keyword in transaction_keywords)
-        
-        return has_amount and has_keyword
+        # Must have transaction keyword and amount indicator
+        return bool(_TXN_KEYWORDS_RE.search(sms_lower)) and bool(_TXN_AMOUNT_RE.search(sms_lower))
     
     @staticmethod
     def _extract_amount(sms_body: str) -> Optional[float]:
         """Extract amount from SMS"""
-        # Patterns: ₹299, Rs. 299, INR 299, 299.00, etc.
-        patterns = [
-            r'[₹]?\s*(\d+[.,]\d{2})',  # ₹299.00 or 299.00
-            r'[₹]?\s*(\d+)',  # ₹299 or 299
-            r'rs\.?\s*(\d+[.,]?\d*)',  # Rs. 299 or Rs 299
-            r'inr\s*(\d+[.,]?\d*)',  # INR 299
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, sms_body, re.IGNORECASE)
+        for pattern in _AMOUNT_PATTERNS:
+            match = pattern.search(sms_body)
             if match:
                 amount_str = match.group(1).replace(',', '')
                 try:
@@ -155,12 +261,9 @@ class SMSParser:
     @staticmethod
     def _detect_transaction_type(sms_lower: str) -> str:
         """Detect if transaction is debit or credit"""
-        credit_keywords = ["credited", "received", "deposit", "refund"]
-        debit_keywords = ["debited", "paid", "spent", "purchase", "withdrawal"]
-        
-        if any(keyword in sms_lower for keyword in credit_keywords):
+        if _CREDIT_RE.search(sms_lower):
             return "credit"
-        elif any(keyword in sms_lower for keyword in debit_keywords):
+        elif _DEBIT_RE.search(sms_lower):
             return "debit"
         
         # Default: check context
@@ -172,26 +275,15 @@ class SMSParser:
     @staticmethod
     def _extract_merchant(sms_body: str, sms_lower: str) -> Optional[str]:
         """Extract merchant name from SMS"""
-        # Common merchant patterns
-        merchants = [
-            "phonepe", "gpay", "paytm", "amazon pay",
-            "zomato", "swiggy", "uber", "ola",
-            "amazon", "flipkart", "myntra"
-        ]
-        
-        for merchant in merchants:
-            if merchant in sms_lower:
-                return merchant.title()
+        # Common merchant names. Plain substring checks in priority order beat
+        # one regex over all of them; the regexes below only run on a miss.
+        for name in _KNOWN_MERCHANTS:
+            if name in sms_lower:
+                return name.title()
         
         # Try to extract from "paid to" or "at" patterns
-        patterns = [
-            r'paid\s+to\s+([A-Za-z\s]+)',
-            r'at\s+([A-Za-z\s]+)',
-            r'to\s+([A-Za-z\s]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, sms_body, re.IGNORECASE)
+        for pattern in _MERCHANT_PATTERNS:
+            match = pattern.search(sms_body)
             if match:
                 merchant = match.group(1).strip()
                 if len(merchant) < 30:  # Reasonable merchant name length
@@ -203,80 +295,75 @@ class SMSParser:
     def _guess_category(merchant: Optional[str], sms_lower: str) -> Optional[str]:
         """Guess category based on merchant or SMS content"""
         if merchant:
-            merchant_lower = merchant.lower()
-            for key, category in SMSParser.MERCHANT_CATEGORIES.items():
-                if key in merchant_lower:
-                    return category
+            category = SMSParser._merchant_category(merchant.lower())
+            if category:
+                return category
         
         # Fallback: check SMS content for category hints
-        if any(word in sms_lower for word in ["food", "restaurant", "order"]):
-            return "Food"
-        elif any(word in sms_lower for word in ["taxi", "cab", "ride", "travel"]):
-            return "Travel"
-        elif any(word in sms_lower for word in ["bill", "electricity", "gas", "water"]):
-            return "Bills"
-        elif any(word in sms_lower for word in ["medicine", "pharmacy", "medical"]):
-            return "Medicine"
+        for hint, category in _CATEGORY_HINTS:
+            if hint.search(sms_lower):
+                return category
         
         return "Other"
     
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _merchant_category(merchant_lower: str) -> Optional[str]:
+        """
+        Category of the first MERCHANT_CATEGORIES key found in the merchant name.
+        The same few merchants recur across SMS, so repeats are a dict hit
+        instead of a scan over every key.
+        """
+        for key, category in SMSParser.MERCHANT_CATEGORIES.items():
+            if key in merchant_lower:
+                return category
+        return None
+    
     @staticmethod
     def _extract_date(sms_body: str) -> Optional[datetime]:
         """Extract transaction date from SMS"""
-        # Common date patterns in Indian SMS
-        patterns = [
-            r'(\d{2}[/-]\d{2}[/-]\d{4})',  # DD/MM/YYYY
-            r'(\d{2}[/-]\d{2}[/-]\d{2})',  # DD/MM/YY
-            r'(\d{1,2}\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{4})',  # DD MMM YYYY
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, sms_body, re.IGNORECASE)
-            if match:
-                try:
-                    date_str = match.group(1)
-                    # Try parsing different formats
-                    for fmt in ["%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y"]:
-                        try:
-                            return datetime.strptime(date_str, fmt)
-                        except ValueError:
-                            continue
-                except:
-                    continue
+        for pattern in _DATE_PATTERNS:
+            match = pattern.search(sms_body)
+            if not match:
+                continue
+            date_str = match.group(1)
+            # Same rules as the strptime formats this replaces: one separator
+            # throughout, ASCII digits, and %y's pivot for two-digit years
+            if date_str[2] != date_str[5] or not date_str.isascii():
+                continue
+            year = int(date_str[6:])
+            if len(date_str) == 8:
+                year += 2000 if year < 69 else 1900
+            try:
+                return datetime(year, int(date_str[3:5]), int(date_str[:2]))
+            except ValueError:
+                continue
         
         return None
     
     @staticmethod
-    def _extract_account_number(sms_body: str) -> Optional[str]:
+    def _extract_account_number(sms_body: str, sms_lower: Optional[str] = None) -> Optional[str]:
         """Extract last 4 digits of account number"""
-        # Pattern: "A/c **1234" or "Account ending 1234"
-        patterns = [
-            r'a/c\s*\*+\s*(\d{4})',
-            r'account\s+ending\s+(\d{4})',
-            r'ending\s+(\d{4})',
-            r'\*\*(\d{4})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, sms_body, re.IGNORECASE)
-            if match:
-                return match.group(1)
-        
-        return None
+        return SMSParser._search_after_literal(_ACCT_PATTERNS, sms_body, sms_lower)
     
     @staticmethod
-    def _extract_reference_number(sms_body: str) -> Optional[str]:
+    def _extract_reference_number(sms_body: str, sms_lower: Optional[str] = None) -> Optional[str]:
         """Extract transaction reference number"""
-        # Pattern: "Ref No: ABC123" or "Txn ID: 123456"
-        patterns = [
-            r'ref\s*(?:no|number)[:.]?\s*([A-Z0-9]+)',
-            r'txn\s*(?:id|ref)[:.]?\s*([A-Z0-9]+)',
-            r'reference[:.]?\s*([A-Z0-9]+)',
-            r'upi\s*ref\s*([A-Z0-9]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, sms_body, re.IGNORECASE)
+        return SMSParser._search_after_literal(_REF_PATTERNS, sms_body, sms_lower)
+    
+    @staticmethod
+    def _search_after_literal(patterns, sms_body: str, sms_lower: Optional[str]) -> Optional[str]:
+        """First group of the first pattern that matches, trying each only where its literal occurs"""
+        if sms_lower is None:
+            sms_lower = sms_body.lower()
+        # Offsets carry over unless lowercasing changed the length (e.g. "İ")
+        same_offsets = len(sms_lower) == len(sms_body)
+        
+        for literal, pattern in patterns:
+            start = sms_lower.find(literal)
+            if start < 0:
+                continue
+            match = pattern.search(sms_body, start if same_offsets else 0)
             if match:
                 return match.group(1)
         
@@ -285,7 +372,7 @@ class SMSParser:
     @staticmethod
     def generate_sms_hash(amount: float, merchant: str, date: datetime) -> str:
         """Generate hash for duplicate detection"""
-        import hashlib
+        # blake2b at 16 bytes keeps the 32-char hex key length of the old md5 digest
         hash_string = f"{amount}_{merchant}_{date.strftime('%Y-%m-%d %H:%M')}"
-        return hashlib.md5(hash_string.encode()).hexdigest()
+        return hashlib.blake2b(hash_string.encode(), digest_size=16).hexdigest()
 
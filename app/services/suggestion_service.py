@@ -1,3 +1,4 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app import models
@@ -8,30 +9,36 @@ def generate_expense_suggestions(db: Session, user_id: int):
     Generate expense suggestions from learned patterns
     """
 
-    patterns = db.query(models.ExpensePattern)\
+    # Only the two columns used below, as plain rows rather than ORM objects
+    patterns = db.query(models.ExpensePattern.category, models.ExpensePattern.avg_amount)\
         .filter(models.ExpensePattern.user_id == user_id)\
         .filter(models.ExpensePattern.confidence >= 0.6)\
         .all()
 
-    for pattern in patterns:
-        # Avoid duplicate pending suggestions
-        existing = db.query(models.ExpenseSuggestion).filter(
+    # Avoid duplicate pending suggestions: fetch every pending category in one query
+    pending = {
+        category for (category,) in db.query(models.ExpenseSuggestion.category).filter(
             models.ExpenseSuggestion.user_id == user_id,
-            models.ExpenseSuggestion.category == pattern.category,
-            models.ExpenseSuggestion.status == "pending"
-        ).first()
-
-        if existing:
-            continue
-
-        suggestion = models.ExpenseSuggestion(
-            user_id=user_id,
-            category=pattern.category,
-            suggested_amount=round(pattern.avg_amount),
-            suggested_date=datetime.utcnow(),
-            source="pattern"
+            models.ExpenseSuggestion.status == "pending",
+            models.ExpenseSuggestion.category.in_({p.category for p in patterns})
         )
+    }
 
-        db.add(suggestion)
-
+    now = datetime.utcnow()
+    rows = []
+    for pattern in patterns:
+        if pattern.category in pending:
+            continue
+        pending.add(pattern.category)
+
+        rows.append({
+            "user_id": user_id,
+            "category": pattern.category,
+            "suggested_amount": round(pattern.avg_amount),
+            "suggested_date": now,
+            "source": "pattern",
+        })
+
+    if rows:
+        db.execute(insert(models.ExpenseSuggestion), rows)
     db.commit()
@@ -1,14 +1,56 @@
-from passlib.context import CryptContext
+import os
+import threading
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
-def _truncate_for_bcrypt(password: str) -> str:
-    return password.encode("utf-8")[:72].decode("utf-8", errors="ignore")
+# New hashes use argon2id; bcrypt is only kept to verify hashes created before
+# the switch, which get upgraded on the user's next successful login.
+# OWASP's argon2id baseline (19 MiB, t=2): tens of ms per hash instead of
+# bcrypt's ~250 ms; hashes made with older parameters are upgraded the same way.
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# argon2 and bcrypt both release the GIL, so the sync routes already hash in
+# parallel on FastAPI's threadpool. Bound how many run at once so a burst of
+# logins can't oversubscribe the CPU or allocate 19 MiB per threadpool worker.
+_hash_slots = threading.BoundedSemaphore(
+    int(os.getenv("PASSWORD_HASH_CONCURRENCY", os.cpu_count() or 1))
+)
+
+def _truncate_for_bcrypt(password: str) -> bytes:
+    # bcrypt only reads 72 bytes. Legacy hashes were made from the password
+    # cut there and decoded, which dropped a character split by the cut, so
+    # back up to that character's lead byte instead of round-tripping via str.
+    encoded = password.encode("utf-8")
+    if len(encoded) <= 72:
+        return encoded
+    cut = 72
+    while cut and encoded[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return encoded[:cut]
+
+def _is_legacy_hash(hashed_password: str) -> bool:
+    return not hashed_password.startswith("$argon2")
 
 def hash_password(password: str) -> str:
-    safe_password = _truncate_for_bcrypt(password)
-    return pwd_context.hash(safe_password)
+    with _hash_slots:
+        return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    safe_password = _truncate_for_bcrypt(plain_password)
-    return pwd_context.verify(safe_password, hashed_password)
\ No newline at end of file
+    with _hash_slots:
+        if _is_legacy_hash(hashed_password):
+            try:
+                return bcrypt.checkpw(_truncate_for_bcrypt(plain_password), hashed_password.encode("utf-8"))
+            except ValueError:
+                return False
+        try:
+            return password_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True for bcrypt hashes and argon2 hashes with outdated parameters"""
+    if _is_legacy_hash(hashed_password):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)